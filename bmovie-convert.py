@@ -0,0 +1,17 @@
+# Converts the b-movie catalog (bmovies.csv) into a packed array of integer IMDb IDs (bmovies.npy)
+#
+# Usage:
+#   python bmovie-convert.py                       # bmovies.csv -> bmovies.npy
+#   python bmovie-convert.py other.csv other.npy
+#
+# The bot memory-maps bmovies.npy at startup instead of loading the CSV into a DataFrame,
+# so load time and resident memory stay flat as the catalog grows.
+
+import sys
+
+from bmovie_catalog import convert
+
+
+if __name__ == '__main__':
+    ids = convert(*sys.argv[1:3])
+    print(f'Wrote {len(ids)} IDs ({ids.nbytes / 1024:.1f} KB)')
@@ -1,26 +1,177 @@
-# Parses HTML Export from:
+# Builds the b-movie catalog (bmovies.csv) from saved HTML exports of:
 # https://www.imdb.com/search/title/?title_type=feature&release_date=1950-01-01,&keywords=b-movie
+#
+# Usage:
+#   python bmovie-parser.py                        # parses bmovie.html
+#   python bmovie-parser.py pages/ page-2.html     # any mix of saved pages and directories of pages
+#   python bmovie-parser.py --jobs 4 pages/        # parse four pages at a time in worker processes
+#
+# Pages are streamed through an incremental lxml parser instead of being loaded whole into
+# BeautifulSoup. IDs already in the catalog are skipped and new IDs are appended to the end
+# of bmovies.csv, so exports can be added a few pages at a time. The packed copy of the catalog
+# that the bot memory-maps (bmovies.npy) is rewritten alongside it.
 
+import os
 import re
-from bs4 import BeautifulSoup
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
 import pandas as pd
 
-with open('bmovie.html', 'r', encoding='utf-8') as f:
-    soup = BeautifulSoup(f, 'html.parser')
+from bmovie_catalog import CATALOG, PACKED_CATALOG, save_packed
+
+
+CHUNK_SIZE = 64 * 1024
+
+ITEM_CLASS = 'ipc-metadata-list-summary-item'
+TITLE_HREF = re.compile(r'^/title/tt(\d+)')
+
+
+def find_pages(paths):
+    """ Expand the command line paths into saved HTML pages, walking directories in name order """
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(('.html', '.htm')):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def parse_page(path):
+    """ Yield the numeric IMDb ID of the first title link within each search result item """
+
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+
+    # Nesting depth of <li> elements inside the current result item (0 when outside of one)
+    depth = 0
+    found = False
+
+    def handle(events):
+        nonlocal depth, found
+
+        for event, element in events:
+            if not isinstance(element.tag, str):
+                continue
+
+            if event == 'start':
+                if element.tag == 'li':
+                    if depth > 0:
+                        depth += 1
+                    elif ITEM_CLASS in element.get('class', '').split():
+                        depth = 1
+                        found = False
+
+                elif element.tag == 'a' and depth > 0 and not found:
+                    match = TITLE_HREF.match(element.get('href', ''))
+                    if match:
+                        found = True
+                        yield match.group(1)
+
+            elif element.tag == 'li' and depth > 0:
+                depth -= 1
+
+                # Drop finished result items so memory stays flat on very long pages
+                if depth == 0:
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from handle(parser.read_events())
+
+    parser.close()
+    yield from handle(parser.read_events())
+
+
+def read_page(path):
+    """ Every ID on one page and the time taken to parse it, so pages can be parsed in worker processes """
+
+    start = time.perf_counter()
+    imdb_ids = list(parse_page(path))
+
+    return path, imdb_ids, time.perf_counter() - start
+
+
+def load_catalog(path):
+
+    if not os.path.exists(path):
+        return []
+
+    return pd.read_csv(path, dtype = {'ID': str})['ID'].tolist()
+
+
+def save_catalog(path, imdb_ids):
+
+    # Write to a temporary file first so an interrupted run never leaves a truncated catalog
+    tmp_path = path + '.tmp'
+    pd.DataFrame(imdb_ids, columns=['ID']).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+
+    arg_parser = argparse.ArgumentParser(description='Merge saved IMDb b-movie search pages into the bot catalog')
+    arg_parser.add_argument('paths', nargs='*', default=['bmovie.html'], help='saved HTML pages or directories of pages')
+    arg_parser.add_argument('--catalog', default=CATALOG, help=f'catalog CSV to merge into (default: {CATALOG})')
+    arg_parser.add_argument('--packed', default=PACKED_CATALOG, help=f'packed catalog loaded by the bot (default: {PACKED_CATALOG})')
+    arg_parser.add_argument('--jobs', type=int, default=1, help='pages to parse at once in worker processes (default: 1)')
+    args = arg_parser.parse_args(argv)
+
+    imdb_ids = load_catalog(args.catalog)
+    seen = set(imdb_ids)
+    existing = len(imdb_ids)
+
+    pages = 0
+    total_bytes = 0
+    total_ids = 0
+    start = time.perf_counter()
+
+    # Results come back in page order either way, so the catalog is the same whatever the number of jobs
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    results = executor.map(read_page, list(find_pages(args.paths))) if executor else map(read_page, find_pages(args.paths))
+
+    for page, page_ids, page_elapsed in results:
+        page_new = 0
+
+        for imdb_id in page_ids:
+            if imdb_id not in seen:
+                seen.add(imdb_id)
+                imdb_ids.append(imdb_id)
+                page_new += 1
+
+        pages += 1
+        total_ids += len(page_ids)
+        total_bytes += os.path.getsize(page)
+        print(f'{page}: {len(page_ids)} titles, {page_new} new ({page_elapsed:.3f}s)')
+
+    if executor:
+        executor.shutdown()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    if pages == 0:
+        print('No pages found')
+        return 1
 
-items = soup.select("li.ipc-metadata-list-summary-item")
+    save_catalog(args.catalog, imdb_ids)
+    save_packed(args.packed, imdb_ids)
 
-imdb_ids = []
+    print(f'Parsed {pages} pages ({total_bytes / 1e6:.1f} MB) in {elapsed:.2f}s: '
+          f'{total_bytes / 1e6 / elapsed:.1f} MB/s, {total_ids / elapsed:.0f} titles/s')
+    print(f'Added {len(imdb_ids) - existing} new titles to {args.catalog} ({len(imdb_ids)} total)')
 
-for item in items:
-    link_tag = item.find("a", href=re.compile(r"^/title/tt\d+"))
-    if link_tag:
-        href = link_tag["href"]
-        match = re.search(r"/title/tt(\d+)", href)
-        if match:
-            imdb_id = match.group(1)  # Just the numeric part
-            imdb_ids.append(imdb_id)
+    return 0
 
 
-bmovies_df = pd.DataFrame(imdb_ids, columns=["ID"])
-bmovies_df.to_csv('bmovies.csv', index=False)
+if __name__ == '__main__':
+    sys.exit(main())
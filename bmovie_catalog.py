@@ -0,0 +1,43 @@
+# The packed b-movie catalog (bmovies.npy): the IMDb IDs from bmovies.csv as a flat array of uint32, which the bot
+# memory-maps instead of loading the CSV into a DataFrame. Shared by the bot, bmovie-convert.py and bmovie-parser.py.
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+CATALOG = 'bmovies.csv'
+PACKED_CATALOG = 'bmovies.npy'
+
+
+def read_ids(csv_path=CATALOG):
+    """ IMDb IDs from the catalog CSV as a uint32 array, skipping blank rows """
+
+    ids = pd.read_csv(csv_path, dtype = {'ID': str})['ID']
+    ids = ids.dropna().str.strip()
+    return ids[ids != ''].astype(np.uint32).to_numpy()
+
+
+def save_packed(npy_path, imdb_ids):
+    """ Write IDs (numbers or numeric strings) to the packed catalog """
+
+    ids = np.asarray(imdb_ids).astype(np.uint32)
+
+    # Write to a uniquely named temporary file first, so a running bot never maps a half written array
+    # and two processes rebuilding the catalog at once never write into the same file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(npy_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, ids)
+        os.replace(tmp_path, npy_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return ids
+
+
+def convert(csv_path=CATALOG, npy_path=PACKED_CATALOG):
+    return save_packed(npy_path, read_ids(csv_path))
@@ -5,7 +5,10 @@
 # Standard python libraries
 import io
 import os
+import asyncio
 import sys
+import re
+import signal
 import math
 import random
 import pytz
@@ -13,17 +16,35 @@ from datetime import datetime, timedelta
 from copy import deepcopy
 import json
 import time
+import bisect
+import contextlib
+import hashlib
+import heapq
+import itertools
+import threading
+import traceback
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from functools import partial
 from urllib.parse import quote
 
 # Third party libraries
+import aiohttp
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 import pandas as pd
 import numpy as np
 import requests
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import seaborn as sns
+from sortedcontainers import SortedList
+
+import bmovie_catalog
+from bmovie_catalog import CATALOG, PACKED_CATALOG
+import clumsy_render
+from clumsy_render import WHEEL_SPINS_TO_WIN, CONTACT_SHEET_COLUMNS, CONTACT_SHEET_ROWS, renderTally, renderBingo, renderContactSheet
 
 
 ###############################################
@@ -31,51 +52,1360 @@ import seaborn as sns
 ###############################################
 
 
-# Global running list of winning movie titles for the current week
-titles = []
+def loadBmovies():
+    """ Memory-map the packed catalog of numeric IMDb IDs, rebuilding bmovies.npy from bmovies.csv if it is missing or stale """
+
+    if not os.path.exists(PACKED_CATALOG) or os.path.getmtime(PACKED_CATALOG) < os.path.getmtime(CATALOG):
+        print(f'{PACKED_CATALOG} is missing or older than {CATALOG}, rebuilding it')
+        ids = bmovie_catalog.read_ids()
+
+        # If the directory is read-only, sample the array in memory instead
+        try:
+            bmovie_catalog.save_packed(PACKED_CATALOG, ids)
+        except OSError as e:
+            print(f'Could not write {PACKED_CATALOG}: {e}')
+            return ids
+
+    return np.load(PACKED_CATALOG, mmap_mode='r')
+
+
+# Catalog of b-movies for the .random command (loaded by setup()) and a shared random generator for sampling it
+bmovies = None
+rng = np.random.default_rng()
+
+
+class FallenList:
+    """ Sorted list of The Fallen, persisted as a CSV snapshot (fallen.csv) plus an append-only journal of changes """
+
+    def __init__(self, path='fallen.csv', journal_path='fallen.journal'):
+        self.path = path
+        self.journal_path = journal_path
+        self.movies = SortedList()
+
+        if os.path.exists(path):
+            self.movies.update(pd.read_csv(path, dtype = {'Movie': str})['Movie'].dropna())
+
+        # Number of journal entries not yet folded into the snapshot
+        self.pending = 0
+
+        if os.path.exists(journal_path):
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash, everything before it is still valid
+                        break
+                    self._apply(entry['op'], entry['movie'])
+                    self.pending += 1
+
+        self.journal = open(journal_path, 'ab')
+
+        # Held while compacting so the compaction loop and .kill never swap the journal out from under each other
+        self.compact_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.movies)
+
+    def __iter__(self):
+        return iter(self.movies)
+
+    def __getitem__(self, index):
+        return self.movies[index]
+
+    def __contains__(self, movie):
+        return movie in self.movies
+
+    def _apply(self, op, movie):
+        if op == 'add':
+            if movie not in self.movies:
+                self.movies.add(movie)
+        elif op == 'remove':
+            self.movies.discard(movie)
+
+    def _log(self, op, movie):
+        self.journal.write(json.dumps({'op': op, 'movie': movie}).encode('utf-8') + b'\n')
+        self.journal.flush()
+        self.pending += 1
+
+    def add(self, movie):
+        """ Add a movie unless it is already on the list. Returns True if the list changed. """
+
+        if movie in self.movies:
+            return False
+
+        self.movies.add(movie)
+        self._log('add', movie)
+        return True
+
+    def update(self, movies):
+        for movie in movies:
+            self.add(movie)
+
+    def pop(self, index):
+        """ Remove and return the movie at the given (0-based) index """
+
+        movie = self.movies.pop(index)
+        self._log('remove', movie)
+        return movie
+
+    def remove(self, movie):
+        """ Remove a movie by title. Returns True if it was on the list. """
+
+        if movie not in self.movies:
+            return False
+
+        self.movies.remove(movie)
+        self._log('remove', movie)
+        return True
+
+    def _write_snapshot(self, movies):
+        tmp_path = self.path + '.tmp'
+        pd.DataFrame(movies, columns = ['Movie']).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    async def compact(self):
+        """ Fold the journal into a fresh fallen.csv snapshot without blocking the event loop """
+
+        async with self.compact_lock:
+            if self.pending == 0:
+                return
+
+            snapshot = list(self.movies)
+            offset = self.journal.tell()
+
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+
+            # Changes made while the snapshot was being written are kept in the new journal
+            self.journal.close()
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(tail)
+            os.replace(tmp_path, self.journal_path)
+
+            self.journal = open(self.journal_path, 'ab')
+            self.pending = tail.count(b'\n')
+
+
+def popcount(bits):
+    """ Number of set bits along the last axis of a uint64 bitset array """
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+
+    return np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def stackBits(bitsets, width=0):
+    """ Stack bitsets of different widths (the voter registry grows over time) into one zero-padded matrix """
+
+    width = max([width] + [bits.shape[-1] for bits in bitsets])
+    matrix = np.zeros((len(bitsets), width), dtype=np.uint64)
+
+    for i, bits in enumerate(bitsets):
+        matrix[i, :bits.shape[-1]] = bits
+
+    return matrix
+
+
+class VoterRegistry:
+    """ Dense indices for Discord user IDs (persisted in voters.csv), so a group of voters can be stored as a bitset """
+
+    def __init__(self, path):
+        self.path = path
+        self.user_ids = []
+
+        if os.path.exists(path):
+            self.user_ids = pd.read_csv(path, dtype = {'user_id': np.int64})['user_id'].tolist()
+
+        self.index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+    def width(self):
+        """ Number of 64 bit words needed for a bitset over every registered voter """
+
+        return (len(self.user_ids) + 63) // 64
+
+    def indexOf(self, user_id):
+
+        index = self.index.get(user_id)
+
+        if index is None:
+            index = self.index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if new_file:
+                    f.write('user_id\n')
+                f.write(f'{user_id}\n')
+
+        return index
+
+    def bitset(self, user_ids):
+
+        indices = np.array([self.indexOf(user_id) for user_id in user_ids], dtype=np.uint64)
+
+        bits = np.zeros(self.width(), dtype=np.uint64)
+        np.bitwise_or.at(bits, (indices // np.uint64(64)).astype(np.intp), np.left_shift(np.uint64(1), indices % np.uint64(64)))
+
+        return bits
+
+
+class VoteArchive:
+    """ Weekly snapshots of every nomination, stored column-wise as NumPy structured arrays (one .npy file per rollover)
+        alongside a matrix of each nomination's voters as bitsets (see VoterRegistry) """
+
+    OUTCOMES = ['rollover', 'fallen', 'winner']
+
+    # Narrowest title column. Each week is saved with a column wide enough for its longest title, so titles are never truncated.
+    TITLE_WIDTH = 128
+
+    @classmethod
+    def dtype(cls, width=0):
+        return np.dtype([
+            ('week', 'datetime64[s]'),
+            ('title', f'U{max(width, cls.TITLE_WIDTH)}'),
+            ('votes', 'i4'),
+            ('voters', 'i4'),
+            ('nominated_at', 'datetime64[s]'),
+            ('outcome', 'i1')
+        ])
+
+    @staticmethod
+    def titleWidth(rows):
+        return rows.dtype['title'].itemsize // np.dtype('U1').itemsize
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        weeks = []
+        voter_bits = []
+
+        for name in sorted(os.listdir(directory)):
+            if name.startswith('week-') and name.endswith('.npy'):
+                rows = np.load(os.path.join(directory, name))
+                weeks.append(rows)
+
+                # Weeks archived before voters were recorded have no bitsets
+                bits_path = os.path.join(directory, 'voters-' + name[len('week-'):])
+                voter_bits.append(np.load(bits_path) if os.path.exists(bits_path) else np.zeros((len(rows), 0), dtype=np.uint64))
+
+        dtype = self.dtype(max([self.titleWidth(rows) for rows in weeks], default=0))
+        self.rows = np.concatenate([rows.astype(dtype) for rows in weeks]) if weeks else np.empty(0, dtype=dtype)
+        self.voter_bits = np.concatenate([stackBits(bits, self.width(voter_bits)) for bits in voter_bits]) if weeks else np.zeros((0, 0), dtype=np.uint64)
+
+    @staticmethod
+    def width(matrices):
+        return max([matrix.shape[1] for matrix in matrices], default=0)
+
+    def append(self, rollover_time, nominations, voter_bits):
+        """ Save one week of (title, votes, voters, nominated_at, outcome) tuples and the matching voter bitsets """
+
+        week = np.datetime64(rollover_time.replace(tzinfo=None), 's')
+
+        rows = np.empty(len(nominations), dtype=self.dtype(max([len(str(nomination[0])) for nomination in nominations], default=0)))
+        rows['week'] = week
+
+        if nominations:
+            titles, votes, voters, nominated_at, outcomes = zip(*nominations)
+            rows['title'] = titles
+            rows['votes'] = votes
+            rows['voters'] = voters
+            rows['nominated_at'] = [np.datetime64(created_at.replace(tzinfo=None), 's') for created_at in nominated_at]
+            rows['outcome'] = [self.OUTCOMES.index(outcome) for outcome in outcomes]
+
+        bits = stackBits(voter_bits)
+
+        stamp = str(week).replace(':', '') + '.npy'
+        np.save(os.path.join(self.directory, 'voters-' + stamp), bits)
+        np.save(os.path.join(self.directory, 'week-' + stamp), rows)
+
+        dtype = self.dtype(max(self.titleWidth(self.rows), self.titleWidth(rows)))
+        self.rows = np.concatenate([self.rows.astype(dtype), rows.astype(dtype)])
+
+        width = max(bits.shape[1], self.voter_bits.shape[1])
+        self.voter_bits = np.concatenate([stackBits(self.voter_bits, width), stackBits(bits, width)])
+
+    def weeks(self):
+        """ Per-week totals: week, nominations, votes, distinct voters and mean votes per nomination """
+
+        weeks, inverse = np.unique(self.rows['week'], return_inverse=True)
+        nominations = np.bincount(inverse)
+        votes = np.bincount(inverse, weights=self.rows['votes'])
+
+        # OR together each week's voter bitsets, then count the bits
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(weeks)))
+        if self.voter_bits.shape[1] > 0:
+            voters = popcount(np.bitwise_or.reduceat(self.voter_bits[order], starts, axis=0))
+        else:
+            voters = np.zeros(len(weeks), dtype=np.int64)
+
+        return weeks, nominations, votes, voters, votes / nominations
+
+    def never_won(self):
+        """ Titles that have never won, ordered by number of weeks nominated and then total votes """
+
+        titles, inverse = np.unique(self.rows['title'], return_inverse=True)
+        week_list, week_inverse = np.unique(self.rows['week'], return_inverse=True)
+
+        # A title nominated twice in one week still counts as one week
+        pairs = np.unique(inverse.astype(np.int64) * len(week_list) + week_inverse)
+        weeks = np.bincount(pairs // len(week_list), minlength=len(titles))
+        votes = np.bincount(inverse, weights=self.rows['votes'], minlength=len(titles))
+        won = np.bincount(inverse, weights=self.rows['outcome'] == self.OUTCOMES.index('winner'), minlength=len(titles)) > 0
+
+        order = np.lexsort((-votes, -weeks))
+        order = order[~won[order]]
+
+        return titles[order], weeks[order], votes[order].astype(int)
+
+
+def normalizeTitle(title, year=True):
+    """ Comparison key for a title: case, accents, punctuation and a leading or trailing article are ignored.
+        A (year) is kept at the end of the key so remakes stay distinct, unless year is False. """
+
+    title = unicodedata.normalize('NFKD', str(title))
+    title = ''.join(c for c in title if not unicodedata.combining(c)).casefold()
+    title = title.replace('&', ' and ')
+
+    years = re.findall(r'\(\s*(\d{4})\s*\)', title)
+    title = re.sub(r'\(\s*\d{4}\s*\)', ' ', title)
+    title = re.sub(r',\s*(the|a|an)\s*$', ' ', title.strip())
+    tokens = re.sub(r'[^\w\s]', ' ', title).split()
+
+    if len(tokens) > 1 and tokens[0] in ('the', 'a', 'an'):
+        tokens = tokens[1:]
+
+    if year:
+        tokens += years
+
+    return ' '.join(tokens)
+
+
+class TitleIndex:
+    """ In-memory trigram index over every title a club has seen, used for .search and duplicate checks.
+        Titles are kept apart by their full key (year included) but ranked by trigrams of the title without its year. """
+
+    def __init__(self):
+        self.ids = {}          # normalized title -> entry id
+        self.titles = []       # entry id -> title as first seen
+        self.sources = []      # entry id -> set of sources ('winner', 'fallen', 'holdover', 'nominated')
+        self.sizes = []        # entry id -> number of distinct trigrams
+        self.postings = {}     # trigram -> list of entry ids
+
+        # NumPy copies of sizes and postings, rebuilt on demand after titles are added
+        self.size_array = np.zeros(0, dtype=np.float32)
+        self.posting_arrays = {}
+
+    @staticmethod
+    def trigrams(key):
+        padded = f'  {key} '
+        return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+    def add(self, title, source):
+
+        key = normalizeTitle(title)
+        if not key:
+            return
+
+        entry = self.ids.get(key)
+
+        if entry is None:
+            entry = len(self.titles)
+            grams = self.trigrams(normalizeTitle(title, year=False))
+
+            self.ids[key] = entry
+            self.titles.append(title)
+            self.sources.append(set())
+            self.sizes.append(len(grams))
+
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(entry)
+                self.posting_arrays.pop(gram, None)
+
+        self.sources[entry].add(source)
+
+    def discard(self, title, source):
+
+        entry = self.ids.get(normalizeTitle(title))
+        if entry is not None:
+            self.sources[entry].discard(source)
+
+    def has(self, title, source):
+        """ Exact (normalized) match for a title from the given source """
+
+        entry = self.ids.get(normalizeTitle(title))
+        return entry is not None and source in self.sources[entry]
+
+    def search(self, query, limit=10, source=None, threshold=0.3):
+        """ Titles ranked by trigram similarity (Dice coefficient) to the query, as (score, title, sources) """
+
+        grams = self.trigrams(normalizeTitle(query, year=False))
+        postings = [self._postings(gram) for gram in grams if gram in self.postings]
+
+        if not postings:
+            return []
+
+        if len(self.size_array) != len(self.sizes):
+            self.size_array = np.array(self.sizes, dtype=np.float32)
+
+        common = np.bincount(np.concatenate(postings), minlength=len(self.titles)).astype(np.float32)
+        scores = 2 * common / (len(grams) + self.size_array)
+
+        # Filter by source first, then rank only the best few that are left
+        candidates = np.flatnonzero(scores >= threshold)
+        wanted = np.fromiter((bool(self.sources[entry]) and (source is None or source in self.sources[entry]) for entry in candidates),
+                             dtype=bool, count=len(candidates))
+        candidates = candidates[wanted]
+
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        return [(float(scores[entry]), self.titles[entry], sorted(self.sources[entry])) for entry in candidates]
+
+    def match(self, title, source, threshold=0.8):
+        """ Best title from the given source that is the same as, or very close to, this one """
+
+        entry = self.ids.get(normalizeTitle(title))
+        if entry is not None and source in self.sources[entry]:
+            return self.titles[entry]
+
+        results = self.search(title, limit=1, source=source, threshold=threshold)
+        return results[0][1] if results else None
+
+    def _postings(self, gram):
+
+        array = self.posting_arrays.get(gram)
+        if array is None:
+            array = self.posting_arrays[gram] = np.array(self.postings[gram], dtype=np.int32)
+        return array
+
+
+class PrefixIndex:
+    """ Sorted index of normalized title suffixes (one per word) answering slash command autocomplete with a binary search """
+
+    def __init__(self, items):
+        """ Items are (title, value) pairs, where value is what the command receives when the title is picked """
+
+        entries = set()
+        for title, value in items:
+            words = normalizeTitle(title).split()
+            for i in range(len(words)):
+                entries.add((' '.join(words[i:]), title, value))
+
+        self.entries = sorted(entries)
+        self.keys = [entry[0] for entry in self.entries]
+
+    def complete(self, prefix, limit=25):
+
+        prefix = normalizeTitle(prefix)
+        results = {}
+
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix) and len(results) < limit:
+            key, title, value = self.entries[i]
+            results.setdefault(value, title)
+            i += 1
+
+        return [(title, value) for value, title in results.items()]
+
+
+# Full channel scans are split into ranges of this many days, a few of which are fetched at once
+BACKFILL_PARTITION_DAYS = 30
+BACKFILL_CONCURRENCY = 4
+BACKFILL_CHECKPOINT_EVERY = 500
+
+
+class HistoryBackfill:
+    """ Full scans of a channel's history, split into snowflake ranges that are fetched concurrently and merged in order.
+        Each range's messages are checkpointed to a CSV file as they arrive, so an interrupted scan resumes where it
+        stopped and ranges that have been scanned to the end are read from disk from then on """
+
+    def __init__(self, directory, concurrency=BACKFILL_CONCURRENCY):
+        self.directory = directory
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+
+        # Range name -> {'after': last message ID saved, 'done': whether the range has been scanned to its end}
+        self.checkpoints = {}
+
+        if os.path.exists(self.path('checkpoints.json')):
+            with open(self.path('checkpoints.json'), 'r', encoding='utf-8') as f:
+                self.checkpoints = json.load(f)
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def partitions(self, channel, now):
+        """ (after, before) snowflake ranges covering the channel from its creation, on a fixed grid so they match between runs """
+
+        span = timedelta(days=BACKFILL_PARTITION_DAYS)
+        boundaries = [channel.id]
+
+        while boundaries[-1] < now:
+            boundaries.append(discord.utils.time_snowflake(channel.created_at + span * len(boundaries)))
+
+        # History is fetched exclusive of both ends, so start each range just before its boundary
+        return [(after - 1, before) for after, before in zip(boundaries, boundaries[1:])]
+
+    async def messages(self, channel):
+        """ Every message in the channel, oldest first, as rows with id, created_at and content """
+
+        async with self.lock:
+            now = discord.utils.time_snowflake(datetime.utcnow().replace(tzinfo = pytz.utc))
+            scans = [asyncio.create_task(self.scan(channel, after, before, now)) for after, before in self.partitions(channel, now)]
+
+            try:
+                for scan in scans:
+                    for row in (await scan).itertuples(index=False):
+                        yield row
+            finally:
+                # Ranges still being fetched keep their checkpoints when a caller stops early
+                for scan in scans:
+                    scan.cancel()
+
+    async def scan(self, channel, after, before, now):
+
+        name = f'{after}-{before}'
+        checkpoint = self.checkpoints.get(name, {'after': after, 'done': False})
+
+        if not checkpoint['done']:
+            async with self.semaphore:
+                last = checkpoint['after']
+                rows = []
+
+                async for message in channel.history(limit=None, after=discord.Object(id=last), before=discord.Object(id=min(before, now)), oldest_first=True):
+                    rows.append((message.id, message.created_at.isoformat(), message.content))
+
+                    if len(rows) >= BACKFILL_CHECKPOINT_EVERY:
+                        await self.checkpoint(name, rows, rows[-1][0], False)
+                        last = rows[-1][0]
+                        rows = []
+
+                # The range containing the present is never finished, later scans pick up where this one stopped
+                await self.checkpoint(name, rows, rows[-1][0] if rows else last, before <= now)
+
+        return await asyncio.to_thread(self.read, name)
+
+    async def checkpoint(self, name, rows, after, done):
+
+        if rows:
+            await asyncio.to_thread(self.append, name, rows)
+
+        self.checkpoints[name] = {'after': after, 'done': done}
+
+        # Small enough to write in place, which keeps concurrent ranges from racing on the file
+        self.saveCheckpoints(self.checkpoints)
+
+    def append(self, name, rows):
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self.path(name + '.csv')
+        pd.DataFrame(rows, columns = ['id', 'created_at', 'content']).to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    def saveCheckpoints(self, checkpoints):
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        tmp_path = self.path('checkpoints.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoints, f)
+        os.replace(tmp_path, self.path('checkpoints.json'))
+
+    def read(self, name):
+
+        if not os.path.exists(self.path(name + '.csv')):
+            return pd.DataFrame(columns = ['id', 'created_at', 'content'])
+
+        rows = pd.read_csv(self.path(name + '.csv'), dtype = {'id': np.int64, 'content': str}, keep_default_na=False)
+
+        # Rows saved just before an interruption may be fetched again on resume
+        rows = rows.drop_duplicates('id').sort_values('id')
+        rows['created_at'] = pd.to_datetime(rows['created_at'], utc=True)
+
+        return rows
+
+
+# TMDB serves each poster in several widths; 'original' can be several megabytes
+TMDB_IMAGE_URL = 'https://image.tmdb.org/t/p/'
+EMBED_POSTER_SIZE = 'w500'
+CONTACT_SHEET_POSTER_SIZE = 'w185'
+
+
+def posterUrl(poster_path, size=EMBED_POSTER_SIZE):
+    return TMDB_IMAGE_URL + size + poster_path
+
+
+class PosterCache:
+    """ TMDB posters downloaded into a content-addressed directory (each image is named by the SHA-256 of its bytes),
+        with index.json mapping TMDB IDs to poster paths and poster paths to image hashes """
+
+    def __init__(self, directory, size=CONTACT_SHEET_POSTER_SIZE, concurrency=8):
+        self.directory = directory
+        self.size = size
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.poster_paths = {}
+        self.images = {}
+
+        if os.path.exists(self.path('index.json')):
+            with open(self.path('index.json'), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.poster_paths = index['poster_paths']
+            self.images = index['images']
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def get(self, tmdb_id):
+        """ Cached poster file for a TMDB ID, or None if it has not been downloaded (or has no poster) """
+
+        digest = self.images.get(self.size + self.poster_paths.get(str(tmdb_id), ''))
+        return self.path(digest + '.jpg') if digest else None
+
+    async def fetch(self, tmdb_ids):
+        """ Download any posters missing from the cache concurrently, returning {tmdb_id: poster file or None} """
+
+        missing = {str(tmdb_id) for tmdb_id in tmdb_ids if self.get(tmdb_id) is None and self.poster_paths.get(str(tmdb_id)) != ''}
+
+        if missing:
+            headers = {
+                "Authorization": f"Bearer {TMDB_TOKEN}"
+            }
+            async with aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as session:
+                await asyncio.gather(*[self.download(session, tmdb_id) for tmdb_id in missing])
+
+            await asyncio.to_thread(self.saveIndex, {'poster_paths': dict(self.poster_paths), 'images': dict(self.images)})
+
+        return {str(tmdb_id): self.get(tmdb_id) for tmdb_id in tmdb_ids}
+
+    async def download(self, session, tmdb_id):
+
+        async with self.semaphore:
+            try:
+                poster_path = self.poster_paths.get(tmdb_id)
+
+                if poster_path is None:
+                    async with session.get(f'https://api.themoviedb.org/3/movie/{tmdb_id}') as resp:
+                        resp.raise_for_status()
+                        movie = await resp.json()
+
+                    # An empty path records that TMDB has no poster, so it is not looked up again
+                    poster_path = self.poster_paths[tmdb_id] = movie.get('poster_path') or ''
+
+                if poster_path == '':
+                    return
+
+                async with session.get(posterUrl(poster_path, self.size)) as resp:
+                    resp.raise_for_status()
+                    data = await resp.read()
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Poster download failed for TMDB ID {tmdb_id}: {e}")
+                return
+
+            digest = hashlib.sha256(data).hexdigest()
+
+            if not os.path.exists(self.path(digest + '.jpg')):
+                await asyncio.to_thread(self.write, digest + '.jpg', data)
+
+            self.images[self.size + poster_path] = digest
+
+    def write(self, filename, data):
+
+        # Write to a temporary file first so an interrupted download never leaves a truncated image
+        tmp_path = self.path(filename + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(filename))
+
+    def saveIndex(self, index):
+        self.write('index.json', json.dumps(index).encode('utf-8'))
+
+
+# Discord signs attachment URLs and they expire after about a day, so only reuse recent uploads
+ATTACHMENT_URL_LIFETIME = 12 * 60 * 60
+
+
+class RenderCache:
+    """ Rendered images keyed by a hash of the data they were drawn from, evicting the least recently used once over max_bytes.
+        The URL of each image's last upload is kept so identical requests can point at it instead of uploading again """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+        # key -> [image bytes, attachment URL, time of upload]
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.entries.move_to_end(key)
+
+        return entry
+
+    def put(self, key, data):
+
+        if key in self.entries:
+            self.bytes -= len(self.entries.pop(key)[0])
+
+        entry = self.entries[key] = [data, None, 0]
+        self.bytes += len(data)
+
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            self.bytes -= len(self.entries.popitem(last=False)[1][0])
+
+        return entry
+
+    async def send(self, ctx, key, filename, embed, render):
+        """ Send an image in an embed, awaiting render() for its bytes only if this key has not been rendered before """
+
+        entry = self.get(key)
+
+        if entry is not None and entry[1] is not None and time.monotonic() - entry[2] < ATTACHMENT_URL_LIFETIME:
+            embed.set_image(url=entry[1])
+            return await ctx.send(embed=embed)
+
+        if entry is None:
+            try:
+                data = await render()
+            except (asyncio.TimeoutError, BrokenProcessPool, MemoryError):
+                await ctx.send("Something went wrong drawing that image, please try again")
+                return None
 
-# Global list of movies returned from TMDB
-movies = []
-holdover = []
-fallen = []
+            entry = self.put(key, data)
 
-# List of past winners, stored in clumsy-movie-winners.csv
-bmovies = pd.read_csv('bmovies.csv', dtype = {'ID': str})
-winners = pd.read_csv('clumsy-movie-winners.csv', dtype = str)
-holdover = pd.read_csv('holdover.csv', dtype = {'Movie': str})
-fallen = pd.read_csv('fallen.csv', dtype = {'Movie': str})
+        embed.set_image(url=f'attachment://{filename}')
+        message = await ctx.send(file=discord.File(io.BytesIO(entry[0]), filename=filename), embed=embed)
 
-# Account/channel specific information stored as environmental variable
+        if message is not None and len(message.attachments) > 0:
+            entry[1] = message.attachments[0].url
+            entry[2] = time.monotonic()
+
+        return message
+
+
+class TokenBucket:
+    """ Allows rate requests per second on average, in bursts of up to capacity """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, reserve=0):
+        """ Seconds until a request can be made while leaving reserve tokens in the bucket (if it holds enough to spare any) """
+
+        self.refill()
+        reserve = min(reserve, self.capacity - 1)
+        return max(0.0, (1 + reserve - self.tokens) / self.rate)
+
+    def take(self):
+
+        self.refill()
+        self.tokens -= 1
+
+
+class OutboundRoute:
+    """ Pending writes for one Discord rate limit route, with counters for .outbound """
+
+    def __init__(self, name, bucket):
+        self.name = name
+        self.bucket = bucket
+
+        # (priority, sequence, time queued, call, future), so equal priorities go out in order
+        self.queue = []
+
+        # Reactions waiting to be added, (message ID, emoji) -> future, so repeats are only sent once
+        self.pending = {}
+
+        self.wake = asyncio.Event()
+        self.task = None
+        self.sent = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class OutboundScheduler:
+    """ Sends Discord writes through a token bucket per route (messages or reactions in one channel) instead of leaving
+        discord.py to sleep on 429s. Interactive replies jump ahead of queued bulk output, and bulk output always leaves
+        a token spare, so a short reply never waits behind a long listing """
+
+    INTERACTIVE = 0
+    BULK = 1
+
+    # Discord allows 5 messages per 5 seconds in a channel, and one reaction per quarter second
+    LIMITS = {
+        'messages': (1.0, 5),
+        'reactions': (4.0, 1)
+    }
+
+    def __init__(self, limits=LIMITS, bulk_reserve=1):
+        self.limits = limits
+        self.bulk_reserve = bulk_reserve
+        self.routes = {}
+        self.sequence = itertools.count()
+
+    def route(self, kind, channel_id):
+
+        name = f'{kind}:{channel_id}'
+        route = self.routes.get(name)
+
+        if route is None:
+            route = self.routes[name] = OutboundRoute(name, TokenBucket(*self.limits[kind]))
+
+        return route
+
+    def submit(self, route, priority, call):
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(route.queue, (priority, next(self.sequence), time.monotonic(), call, future))
+        route.wake.set()
+
+        if route.task is None or route.task.done():
+            route.task = asyncio.create_task(self.drain(route))
+
+        return future
+
+    async def drain(self, route):
+
+        while route.queue:
+            priority = route.queue[0][0]
+            delay = route.bucket.delay(self.bulk_reserve if priority == self.BULK else 0)
+
+            if delay > 0:
+                # Wake early if an interactive reply is queued while bulk output waits
+                route.wake.clear()
+                try:
+                    await asyncio.wait_for(route.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            priority, sequence, queued, call, future = heapq.heappop(route.queue)
+
+            if future.cancelled():
+                continue
+
+            route.bucket.take()
+            wait = time.monotonic() - queued
+            route.total_wait += wait
+            route.max_wait = max(route.max_wait, wait)
+
+            # The caller may have given up (e.g. a cancelled command) while the write was in flight
+            try:
+                result = await call()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+            route.sent += 1
+
+    @staticmethod
+    def sender(destination):
+        """ The send that goes straight to Discord, since a ScheduledContext's own send comes back through the scheduler """
+        return getattr(destination, 'sendNow', destination.send)
+
+    async def send(self, destination, content=None, priority=INTERACTIVE, **kwargs):
+        """ Send a message to a channel or command context, returning the message once it has gone out """
+
+        channel = getattr(destination, 'channel', destination)
+        return await self.submit(self.route('messages', channel.id), priority, partial(self.sender(destination), content, **kwargs))
+
+    async def bulk(self, destination, contents):
+        """ Send a list of messages in order, behind any interactive replies to the same channel """
+
+        route = self.route('messages', getattr(destination, 'channel', destination).id)
+        send = self.sender(destination)
+        return await asyncio.gather(*[self.submit(route, self.BULK, partial(send, content)) for content in contents])
+
+    def react(self, message, emoji, priority=BULK):
+        """ Queue a reaction, batched with the other reactions waiting in the same channel """
+
+        route = self.route('reactions', message.channel.id)
+        key = (message.id, str(emoji))
+
+        if key not in route.pending:
+            route.pending[key] = self.submit(route, priority, partial(message.add_reaction, emoji))
+            route.pending[key].add_done_callback(lambda future: route.pending.pop(key, None))
+
+        return route.pending[key]
+
+    def depths(self):
+        """ (route, interactive queued, bulk queued, sent, mean wait, max wait) for every route used so far """
+
+        results = []
+
+        for route in self.routes.values():
+            interactive = sum(1 for entry in route.queue if entry[0] == self.INTERACTIVE)
+            results.append((route.name, interactive, len(route.queue) - interactive, route.sent, route.total_wait / max(route.sent, 1), route.max_wait))
+
+        return results
+
+
+class RenderPool:
+    """ Worker processes for the CPU heavy renders in clumsy_render, started on first use. A render that runs past the timeout
+        or crashes a worker breaks the whole pool, which is then replaced. The render that timed out fails its own command,
+        and the other renders caught in the broken pool are retried once on the new one. The gateway connection is untouched """
+
+    def __init__(self, workers=2, timeout=60, max_tasks_per_worker=50, memory_limit_mb=512):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.memory_limit_mb = memory_limit_mb
+
+        self.executor = None
+        self.tasks = 0
+
+        # One slot per worker. Jobs wait for a slot rather than in the pool's own queue, so the timeout only counts the
+        # time a job spends running and a job waiting behind a stuck render never gets the pool stopped.
+        self.slots = asyncio.Semaphore(workers)
+
+        # Process IDs the current pool's workers report through a queue as they start, so a pool with a stuck render can
+        # be stopped
+        self.pid_queue = None
+        self.pids = []
+
+    def start(self):
+
+        # Workers are forked from a fork server, never from the bot itself, whose other threads (the watchdog, discord.py's
+        # keep-alive, to_thread workers) may be holding locks at the moment of a fork. The fork server imports this script
+        # (as __mp_main__, so only its definitions, see setup()) and clumsy_render once, and workers start from that copy.
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            # The fork server doesn't inherit this process's sys.path, only its working directory and environment. Without
+            # clumsy_render's directory on its path the preload fails quietly and every worker imports it all over again.
+            module_dir = os.path.dirname(os.path.abspath(clumsy_render.__file__))
+            paths = [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]
+            if module_dir not in paths:
+                os.environ['PYTHONPATH'] = os.pathsep.join([module_dir] + paths)
+
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['__main__', 'clumsy_render'])
+        else:
+            context = multiprocessing.get_context('spawn')
+
+        self.pid_queue = context.SimpleQueue()
+        self.pids = []
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=context,
+                                            initializer=clumsy_render.warm,
+                                            initargs=(self.memory_limit_mb, self.pid_queue))
+        self.tasks = 0
+
+    def worker_pids(self):
+        """ Process IDs of the current pool's workers started so far. Workers that have since exited are included """
+
+        while self.pid_queue is not None and not self.pid_queue.empty():
+            self.pids.append(self.pid_queue.get())
+
+        return list(self.pids)
+
+    def restart(self, executor, kill=False):
+        """ Replace a pool, unless another job has already replaced it """
+
+        if executor is not self.executor:
+            return
+
+        self.executor = None
+
+        if kill:
+            # A job stuck in a worker can't be cancelled, so the workers are stopped outright. Every other job in the
+            # pool then fails with BrokenProcessPool, and run() retries it on the next pool.
+            for pid in self.worker_pids():
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGTERM)
+
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def submit(executor, function, *args):
+        """ Submit a job to a pool, which another job may have shut down since, counting that as the pool breaking """
+
+        try:
+            return executor.submit(function, *args)
+        except RuntimeError as e:
+            raise BrokenProcessPool('The render pool was shut down before the job was submitted') from e
+
+    async def run(self, function, *args, retries=1):
+        """ Run function(*args) in a worker process, raising asyncio.TimeoutError if it runs too long or BrokenProcessPool
+            if the pool breaks under it more than retries times """
+
+        async with self.slots:
+
+            # Workers are recycled every so often, so a render that leaks memory is eventually released
+            if self.executor is not None and self.tasks >= self.workers * self.max_tasks_per_worker:
+                self.restart(self.executor)
+
+            if self.executor is None:
+                self.start()
+
+            executor = self.executor
+            self.tasks += 1
+
+            try:
+                # Submitting can start a worker, which waits on the fork server, and the fork server is still importing
+                # clumsy_render right after it starts
+                future = await asyncio.to_thread(self.submit, executor, function, *args)
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except asyncio.TimeoutError:
+                print(f"{function.__name__} took longer than {self.timeout}s, restarting the render pool")
+                self.restart(executor, kill=True)
+                raise
+            except BrokenProcessPool:
+                # A worker died or another render timed out, and there is no telling which job was at fault
+                self.restart(executor)
+
+                if retries == 0:
+                    raise
+
+                print(f"The render pool broke during {function.__name__}, retrying it on a new pool")
+
+        # Outside the slot, which the retry takes again
+        return await self.run(function, *args, retries=retries - 1)
+
+    def render(self, function, *args):
+        """ Job for RenderCache.send """
+
+        return partial(self.run, function, *args)
+
+
+def readFile(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class Club:
+    """ Configuration and state for a single movie club: its nominations, terminal and test channels plus data files """
+
+    def __init__(self, name, guild_id, movies_channel, terminal_channel, test_channel, data_dir='.'):
+        self.name = name
+        self.guild_id = guild_id
+        self.channel_id = movies_channel
+        self.terminal_id = terminal_channel
+        self.test_id = test_channel
+        self.data_dir = data_dir
+
+        os.makedirs(data_dir, exist_ok=True)
+
+        # Running list of winning movie titles for the current week, and their normalized forms
+        self.titles = []
+        self.excluded = set()
+
+        # Titles nominated since the last rollover, keyed by normalized title
+        self.nominations = {}
+
+        # List of movies returned from the most recent TMDB search
+        self.movies = []
+
+        # Titles from recent TMDB searches (TMDB ID -> title), kept for slash command autocomplete
+        self.tmdb_titles = OrderedDict()
+
+        # Prefix indexes for slash command autocomplete, dropped whenever their source changes
+        self.completions = {}
+
+        # List of past winners, stored in clumsy-movie-winners.csv
+        self.winners = self.readCsv('clumsy-movie-winners.csv', ['title', 'imdb_id', 'tmdb_id'])
+        self.holdover = self.readCsv('holdover.csv', ['Movie'])
+        self.fallen = FallenList(self.path('fallen.csv'), self.path('fallen.journal'))
+        self.vote_archive = VoteArchive(self.path('vote-archive'))
+        self.voters = VoterRegistry(self.path('voters.csv'))
+        self.history = HistoryBackfill(self.path('history'))
+
+        # Fuzzy index over every title this club has seen
+        self.title_index = TitleIndex()
+
+        for title in self.winners['title'].dropna():
+            self.title_index.add(title, 'winner')
+        for title in self.fallen:
+            self.title_index.add(title, 'fallen')
+        for title in self.holdover['Movie'].dropna():
+            self.title_index.add(title, 'holdover')
+
+        archive = self.vote_archive.rows
+        for title in np.unique(archive['title']):
+            self.title_index.add(title, 'nominated')
+        for title in np.unique(archive['title'][archive['outcome'] == VoteArchive.OUTCOMES.index('winner')]):
+            self.title_index.add(title, 'winner')
+
+        rolltime = self.readCsv('rollover-time.csv', ['Time'])
+        if len(rolltime) > 0:
+            self.rollover_time = pd.to_datetime(rolltime['Time'][0]).tz_localize(None)
+        else:
+            self.rollover_time = pd.Timestamp(datetime.utcnow() - timedelta(days=7))
+
+    def path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    def readCsv(self, filename, columns):
+        if not os.path.exists(self.path(filename)):
+            return pd.DataFrame(columns = columns, dtype = str)
+        return pd.read_csv(self.path(filename), dtype = str)
+
+    def lastSaturday(self):
+        return self.rollover_time
+
+    def exclude(self, title):
+        self.titles.append(title)
+        self.excluded.add(normalizeTitle(title))
+
+    def clearExclusions(self):
+        self.titles = []
+        self.excluded = set()
+
+    def isExcluded(self, title):
+        """ Excluded titles with a year only match that year. Without one (e.g. a title from TMDB) they match any year. """
+        return normalizeTitle(title) in self.excluded or normalizeTitle(title, year=False) in self.excluded
+
+    def nominate(self, title):
+        """ Record a nomination for this week, returning the earlier spelling if it was already nominated """
+
+        key = normalizeTitle(title)
+
+        if key in self.nominations:
+            return self.nominations[key]
+
+        self.nominations[key] = title
+        self.completions.pop('nominees', None)
+        return None
+
+    def addWinner(self, title, imdb_id, tmdb_id):
+
+        new_row = pd.DataFrame([{'title': title, 'imdb_id': imdb_id, 'tmdb_id': tmdb_id}])
+        self.winners = pd.concat([self.winners, new_row], ignore_index=True)
+        self.winners.to_csv(self.path('clumsy-movie-winners.csv'), index = False)
+        self.title_index.add(title, 'winner')
+        self.completions.pop('winners', None)
+
+    def addFallen(self, movies):
+        """ Add movies to The Fallen, skipping any already there under a different spelling """
+
+        for movie in movies:
+            if not self.title_index.has(movie, 'fallen'):
+                self.fallen.add(movie)
+                self.title_index.add(movie, 'fallen')
+                self.completions.pop('fallen', None)
+
+    def removeFallen(self, index):
+
+        movie = self.fallen.pop(index)
+        self.title_index.discard(movie, 'fallen')
+        self.completions.pop('fallen', None)
+        return movie
+
+    def removeFallenTitle(self, movie):
+
+        if not self.fallen.remove(movie):
+            return False
+
+        self.title_index.discard(movie, 'fallen')
+        self.completions.pop('fallen', None)
+        return True
+
+    def rememberTmdb(self, tmdb_id, title):
+
+        self.tmdb_titles[str(tmdb_id)] = title
+        self.tmdb_titles.move_to_end(str(tmdb_id))
+
+        while len(self.tmdb_titles) > 1000:
+            self.tmdb_titles.popitem(last=False)
+
+        self.completions.pop('tmdb', None)
+
+    def complete(self, source, prefix):
+        """ Autocomplete (title, value) pairs for 'fallen', 'winners', 'nominees' or 'tmdb'. Fallen and nominated titles
+            are picked by choiceKey (see choiceTitle), winners by their title (a search query) and TMDB results by ID. """
+
+        index = self.completions.get(source)
+
+        if index is None:
+            if source == 'fallen':
+                items = [(movie, choiceKey(movie)) for movie in self.fallen]
+            elif source == 'winners':
+                items = [(movie, movie) for movie in self.winners['title'].dropna()]
+            elif source == 'nominees':
+                items = [(movie, choiceKey(movie)) for movie in self.nominations.values()]
+            else:
+                items = [(title, tmdb_id) for tmdb_id, title in self.tmdb_titles.items()]
+
+            index = self.completions[source] = PrefixIndex(items)
+
+        return index.complete(prefix)
+
+    def choiceTitle(self, source, value):
+        """ Title behind an autocomplete value for 'fallen' or 'nominees', or the value itself if it was typed rather than picked """
+
+        titles = self.fallen if source == 'fallen' else self.nominations.values()
+
+        for title in titles:
+            if choiceKey(title) == value:
+                return title
+
+        return value
+
+    def setHoldover(self, movies):
+
+        for movie in self.holdover['Movie'].dropna():
+            self.title_index.discard(movie, 'holdover')
+
+        self.holdover = pd.DataFrame(sorted(movies), columns = ['Movie'])
+        self.holdover.to_csv(self.path('holdover.csv'), index=False)
+
+        for movie in movies:
+            self.title_index.add(movie, 'holdover')
+
+    def archiveWeek(self, rollover_time, nominations, voter_bits):
+
+        self.vote_archive.append(rollover_time, nominations, voter_bits)
+
+        for title, votes, voters, nominated_at, outcome in nominations:
+            self.title_index.add(title, 'nominated')
+
+    def setRolloverTime(self, rollover_time):
+        """ Write rollover time to an external file and keep it cached for lastSaturday() """
+
+        time_pd = pd.DataFrame(data = {'Time': [rollover_time]})
+        time_pd.to_csv(self.path('rollover-time.csv'), index = False)
+        self.rollover_time = pd.Timestamp(rollover_time).tz_localize(None)
+        self.nominations = {}
+        self.completions.pop('nominees', None)
+
+    def channels(self):
+        return [self.channel_id, self.terminal_id, self.test_id]
+
+# Account specific information stored as environmental variable
 TOKEN = os.environ['DISCORD_BOT_TOKEN']
-CHANNEL_ID = int(os.environ['DISCORD_MOVIES_CHANNEL'])
-TERMINAL_ID = int(os.environ['DISCORD_TERMINAL_CHANNEL'])
-TEST_ID = int(os.environ['DISCORD_TEST_CHANNEL'])
 API_KEY = os.environ['WHEEL_API_KEY']
 TMDB_TOKEN = os.environ['TMDB_TOKEN']
 
+# Optional list of clubs served by this process (see README)
+CLUBS_CONFIG = os.environ.get('CLUMSY_CLUBS_CONFIG', 'clubs.json')
+
+
+def loadClubs():
+    """ Load clubs from clubs.json, or a single club from the DISCORD_*_CHANNEL environmental variables """
+
+    if not os.path.exists(CLUBS_CONFIG):
+        return [Club(name = 'Clumsy Movie Night',
+                     guild_id = None,
+                     movies_channel = int(os.environ['DISCORD_MOVIES_CHANNEL']),
+                     terminal_channel = int(os.environ['DISCORD_TERMINAL_CHANNEL']),
+                     test_channel = int(os.environ['DISCORD_TEST_CHANNEL']))]
+
+    with open(CLUBS_CONFIG, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    return [Club(name = entry['name'],
+                 guild_id = entry.get('guild_id'),
+                 movies_channel = int(entry['movies_channel']),
+                 terminal_channel = int(entry['terminal_channel']),
+                 test_channel = int(entry['test_channel']),
+                 data_dir = entry.get('data_dir', '.')) for entry in config]
+
+
+# Clubs served by this process and the club each channel belongs to, loaded by setup()
+clubs = []
+clubs_by_channel = {}
+
+# Posters and rendered images are shared between clubs, since many will have shown the same movies (posters are loaded by setup())
+posters = None
+renders = RenderCache(max_bytes=int(os.environ.get('RENDER_CACHE_MB', 64)) * 1024 * 1024)
+
+# Every message the bot sends goes through the outbound scheduler, with bulk output (listings, sample votes) queued behind replies
+outbound = OutboundScheduler()
+
+# Charts and contact sheets are drawn in worker processes, several at once on a multi-core machine
+render_pool = RenderPool(workers=int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1))),
+                         timeout=float(os.environ.get('RENDER_TIMEOUT', 60)),
+                         memory_limit_mb=int(os.environ.get('RENDER_WORKER_MEMORY_MB', 512)))
 
-def lastSaturday():
 
-    rolltime = pd.read_csv('rollover-time.csv', parse_dates=['Time'])
-    rolltime['Time'] = rolltime['Time'].dt.tz_localize(None)
-    return rolltime['Time'][0]
+def clubFor(ctx):
+    """ Find the club a command belongs to, by channel first and then by server if it hosts a single club """
+
+    club = clubs_by_channel.get(ctx.channel.id)
+
+    if club is None and ctx.guild is not None:
+        matches = [club for club in clubs if club.guild_id == ctx.guild.id]
+        if len(matches) == 1:
+            club = matches[0]
+
+    return club
 
 
 async def isTerminal(ctx):
-    """ Custom check used in all commands to limit bot commands to skynet terminal OR clumsy testing server """
+    """ Custom check used in all commands to limit bot commands to each club's skynet terminal OR clumsy testing channel """
+
+    club = clubFor(ctx)
+
+    if club is None:
+        return False
 
     if(ctx.command.name in ['rollover', 'holdover', 'print_holdover']):
         return True
 
-    global TERMINAL_ID
-    return ctx.channel.id == TERMINAL_ID or ctx.channel.id == TEST_ID
+    return ctx.channel.id == club.terminal_id or ctx.channel.id == club.test_id
+
+
+class WatchedTree(app_commands.CommandTree):
+    """ Slash command tree that tells the stall watchdog which slash commands are running, like trackCommand does for prefix commands """
+
+    async def interaction_check(self, interaction):
+        if interaction.type == discord.InteractionType.application_command and interaction.command is not None:
+            watchdog.running['/' + interaction.command.qualified_name] = interaction
+        return True
+
+    async def on_error(self, interaction, error):
+        if interaction.command is not None:
+            watchdog.running.pop('/' + interaction.command.qualified_name, None)
+        await super().on_error(interaction, error)
+
+
+class ScheduledContext(commands.Context):
+    """ Command context whose replies go through the outbound scheduler as interactive messages, so the token buckets
+        see every message the bot sends to a channel """
+
+    async def send(self, content=None, **kwargs):
+        return await outbound.send(self, content, **kwargs)
+
+    async def sendNow(self, content=None, **kwargs):
+        return await super().send(content, **kwargs)
 
 
-# All commands for bot will be prefixed with a period (e.g. '.help')
-intents = discord.Intents.default()
-intents.message_content = True
-client = commands.Bot(command_prefix = '.', intents=intents)
-client.add_check(isTerminal)
+class ClumsyBot(commands.AutoShardedBot):
+
+    async def get_context(self, origin, *, cls=ScheduledContext):
+        return await super().get_context(origin, cls=cls)
+
+
+# The bot client, built by setup()
+client = None
 
 
 
@@ -84,6 +1414,18 @@ client.add_check(isTerminal)
 ###############################################
 
 
+async def messageVoters(club, message):
+    """ Bitset of everyone who reacted to a message, over the club's voter registry """
+
+    user_ids = set()
+
+    for reaction in message.reactions:
+        async for user in reaction.users():
+            user_ids.add(user.id)
+
+    return club.voters.bitset(user_ids)
+
+
 class Voting(commands.Cog, name='1: Voting'):
     """Commands to read and summarize movie nominations and voting"""
 
@@ -92,19 +1434,20 @@ class Voting(commands.Cog, name='1: Voting'):
 
 
     @commands.command(brief='Tally votes', 
-                    description='Generates a bar chart of votes for all movies that received at least one reaction since last Saturday at 10:00 (UTC time)')
+                    description='Generates a bar chart of votes for all movies that received at least one reaction since last Saturday at 10:00 (UTC time), annotated with each movie\'s odds of winning the wheel')
     async def tally(self, ctx):
         await ctx.send("Tabulating votes...")
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         # Add movies and number of reactions (i.e. votes) and sort in descending order
 
         votes = []
         number_of_votes = 0
 
-        async for message in channel.history(after=lastSaturday()):
-            if len(message.reactions) > 0 and message.content not in titles:
+        async for message in channel.history(after=club.lastSaturday()):
+            if len(message.reactions) > 0 and not club.isExcluded(message.content):
 
                 number_of_votes = 0
 
@@ -114,39 +1457,11 @@ class Voting(commands.Cog, name='1: Voting'):
                 votes.append((message.content, number_of_votes))
 
 
-        votes = pd.DataFrame.from_records(votes, columns = ['Movie', 'Number of Votes'])
-
-        votes["Number of Votes"] = pd.to_numeric(votes["Number of Votes"])
-        votes.sort_values(by = "Number of Votes", ascending = False, inplace = True)
-        votes['Movie_Trunc'] = votes['Movie'].apply(lambda x: x[:25] + '…' if len(x) > 25 else x)
-
-        sns.set(style="whitegrid")
-        plt.figure(figsize=(10, len(votes) * 0.5))
-        barplot = sns.barplot(x='Number of Votes', y='Movie_Trunc', data=votes, color='steelblue')
-
-        ax = plt.gca()
-        ax.xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-        xlim = ax.get_xlim()
-        offset = (xlim[1] - xlim[0]) * 0.01  # 1% of axis width
-
-        for i, (value, label) in enumerate(zip(votes['Number of Votes'], votes['Movie_Trunc'])):
-            plt.text(value + offset, i, str(value), va='center')
-
-        plt.xlabel('Votes')
-        plt.ylabel('Movie')
-        plt.title('Clumsy Movie Ranking (as of ' + datetime.now().strftime("%m/%d/%Y, %H:%M") + ')')
-        plt.tight_layout()
-
-        plt.savefig('./discord-images/graph.png')
-
-        with open('./discord-images/graph.png', 'rb') as f:
-            file = io.BytesIO(f.read())
-
-        image = discord.File(file, filename='graph.png')
+        # The chart (and its odds) only change when a vote does
+        key = RenderCache.key('tally', WHEEL_SPINS_TO_WIN, sorted(votes))
         embed = discord.Embed(title = "Votes as of " + datetime.now().strftime("%m/%d/%Y, %H:%M:%S"))
-        embed.set_image(url='attachment://graph.png')
 
-        await ctx.send(file=image, embed=embed)
+        await renders.send(ctx, key, 'graph.png', embed, render_pool.render(renderTally, votes))
 
 
     @commands.command(
@@ -157,24 +1472,26 @@ class Voting(commands.Cog, name='1: Voting'):
 
         await ctx.send("Scanning message history (this may take a bit)...")
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
-        # Step 1: Collect titles since last rollover
-        current_titles = set()
+        # Step 1: Collect titles since last rollover, keyed by normalized title
+        current_titles = {}
 
-        EXCLUDED_TITLES = {
+        EXCLUDED_TITLES = {normalizeTitle(title) for title in [
             "Random b-movie (by bot)",
             "Next Week on the Wheel:",
             "Random movie from The Fallen List"
-        }
+        ]}
 
-        async for message in channel.history(after=lastSaturday()):
+        async for message in channel.history(after=club.lastSaturday()):
+            key = normalizeTitle(message.content)
             if (
-                   (message.content) and 
-                   (message.content not in titles) and 
-                   (message.content not in EXCLUDED_TITLES)
+                   (key) and 
+                   (not club.isExcluded(message.content)) and 
+                   (key not in EXCLUDED_TITLES)
                ):
-                current_titles.add(message.content)
+                current_titles.setdefault(key, message.content)
 
         if not current_titles:
             await ctx.send("No titles found since last rollover.")
@@ -183,17 +1500,18 @@ class Voting(commands.Cog, name='1: Voting'):
         # Step 2: Scan full history once to find earliest occurrence of each title
         first_seen = {}
 
-        async for message in channel.history(limit=None, oldest_first=True):
-            content = message.content
+        async with contextlib.aclosing(club.history.messages(channel)) as messages:
+            async for message in messages:
+                key = normalizeTitle(message.content)
 
-            # Only track titles we care about
-            if (content in current_titles) and (content not in EXCLUDED_TITLES):
-                if content not in first_seen:
-                    first_seen[content] = message.created_at
+                # Only track titles we care about
+                if (key in current_titles) and (key not in EXCLUDED_TITLES):
+                    if current_titles[key] not in first_seen:
+                        first_seen[current_titles[key]] = message.created_at
 
-            # Optimization: stop early if we've found all titles
-            if len(first_seen) == len(current_titles):
-                break
+                # Optimization: stop early if we've found all titles
+                if len(first_seen) == len(current_titles):
+                    break
 
         if not first_seen:
             await ctx.send("No matching historical messages found.")
@@ -224,14 +1542,15 @@ class Voting(commands.Cog, name='1: Voting'):
                     description='Calculate the total number of all votes since the last rollover')
     async def votecount(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         # Add movies and number of reactions (i.e. votes) and sort in descending order
 
         number_of_votes = 0
 
-        async for message in channel.history(after=lastSaturday()):
-            if len(message.reactions) > 0 and message.content not in titles:
+        async for message in channel.history(after=club.lastSaturday()):
+            if len(message.reactions) > 0 and not club.isExcluded(message.content):
 
                 for reaction in message.reactions:
                     number_of_votes += reaction.count
@@ -242,10 +1561,11 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Count movies nominated', description='Counts all movies currently nominated since the last rollover')
     async def moviecount(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
         number_of_votes = 0
 
-        async for message in channel.history(after=lastSaturday()):
+        async for message in channel.history(after=club.lastSaturday()):
             number_of_votes += 1
 
         await ctx.send("Number of movies: " + str(number_of_votes) + "\n")
@@ -254,7 +1574,8 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Send list to wheel of names', description='Generates a list for all movies that received at least one reaction since last rollover. Movie titles are duplicated according to number of votes. List is compiled into JSON and submitted to wheel of names application.')
     async def wheel(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         # Create a text list of all movie titles, copied according to number of votes
 
@@ -263,8 +1584,8 @@ class Voting(commands.Cog, name='1: Voting'):
 
         await ctx.send("Preparing list for wheel of names...")
 
-        async for message in channel.history(after=lastSaturday()):
-            if len(message.reactions) > 0 and message.content not in titles:
+        async for message in channel.history(after=club.lastSaturday()):
+            if len(message.reactions) > 0 and not club.isExcluded(message.content):
 
                 number_of_votes = 0
 
@@ -282,7 +1603,7 @@ class Voting(commands.Cog, name='1: Voting'):
         wheel = {
             "wheelConfig": {
                     "displayWinnerDialog": True,
-                    "description": "First movie to 3 spins wins. Click 'Copy this Wheel' to customize.",
+                    "description": f"First movie to {WHEEL_SPINS_TO_WIN} spins wins. Click 'Copy this Wheel' to customize.",
                     "title": "Clumsy Movie Night",
                     "allowDuplicates": True,
                     "maxNames": 50,
@@ -307,8 +1628,8 @@ class Voting(commands.Cog, name='1: Voting'):
             await ctx.send(response.text)
             await ctx.send("Wheel List:\n")
 
-            async for message in channel.history(after=lastSaturday()):
-                if len(message.reactions) > 0 and message.content not in titles:
+            async for message in channel.history(after=club.lastSaturday()):
+                if len(message.reactions) > 0 and not club.isExcluded(message.content):
 
                     number_of_votes = 0
 
@@ -329,7 +1650,8 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Prepare votes for the wheel, printing labels to channel', description='Generates a list for all movies that received at least one reaction since last rollover. Movie titles are duplicated according to number of votes.')
     async def wheel2(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         # Create a text list of all movie titles, copied according to number of votes
 
@@ -338,8 +1660,8 @@ class Voting(commands.Cog, name='1: Voting'):
 
         await ctx.send("Wheel List:\n")
 
-        async for message in channel.history(after=lastSaturday()):
-            if len(message.reactions) > 0 and message.content not in titles:
+        async for message in channel.history(after=club.lastSaturday()):
+            if len(message.reactions) > 0 and not club.isExcluded(message.content):
 
                 number_of_votes = 0
 
@@ -358,11 +1680,11 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Send fallen list to wheel of names', description='Generates a list of movies from the fallen list. List is compiled into JSON and submitted to wheel of names application.')
     async def wheel_fallen(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         # Create a text list of all movie titles, copied according to number of votes
-        global fallen
-        wheel_list = fallen['Movie'].tolist()
+        wheel_list = list(club.fallen)
 
         await ctx.send("Preparing list for wheel of names...")
 
@@ -375,7 +1697,7 @@ class Voting(commands.Cog, name='1: Voting'):
         wheel = {
             "wheelConfig": {
                     "displayWinnerDialog": True,
-                    "description": "First movie to 3 spins wins. Click 'Copy this Wheel' to customize.",
+                    "description": f"First movie to {WHEEL_SPINS_TO_WIN} spins wins. Click 'Copy this Wheel' to customize.",
                     "title": "Clumsy Movie Night",
                     "allowDuplicates": True,
                     "maxNames": 50,
@@ -401,7 +1723,8 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Purge shared wheels', description='Deletes all shared wheels associated with API key')
     async def wheel_purge(self, ctx):
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         headers = {
             'Content-Type': 'application/json',
@@ -410,21 +1733,25 @@ class Voting(commands.Cog, name='1: Voting'):
 
         response = requests.get('https://wheelofnames.com/api/v1/wheels/shared', headers=headers)
 
+        statuses = []
+
         for element in response.json()['data']['wheels']:
             path = element['path']
             response = requests.delete(f'https://wheelofnames.com/api/v1/wheels/{path}', headers=headers)
 
             if(response.status_code != 200):
-                await ctx.send(path + ' purge failed')
+                statuses.append(outbound.send(ctx, path + ' purge failed', priority=OutboundScheduler.BULK))
             else:
-                await ctx.send(path + ' purge complete')
+                statuses.append(outbound.send(ctx, path + ' purge complete', priority=OutboundScheduler.BULK))
+
+        await asyncio.gather(*statuses)
 
 
     @commands.command(brief='Excludes winning movie from the rollover', description='Add winning movie for the current week to a temporary list of winners that should be excluded from rollover. Run prior to rollover function.')
     async def exclude(self, ctx, *, title: str):
 
-        global titles
-        titles.append(title)
+        club = clubFor(ctx)
+        club.exclude(title)
 
         await ctx.send("Excluded from rollover: " + title)
 
@@ -432,13 +1759,12 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Added winning movie to permanent winning list', description='Add winning movie for the current week to a permanent list of winners. Use index from most recent TMDB search to store title and TMDB ID.')
     async def winner(self, ctx, index: int):
 
-        global movies
-        global winners
+        club = clubFor(ctx)
         index = int(index) - 1
         imdb_id = ''
 
         try:
-            movieID = movies[index]['id']
+            movieID = club.movies[index]['id']
 
             url = f"https://api.themoviedb.org/3/movie/{movieID}" 
             headers = {
@@ -452,37 +1778,58 @@ class Voting(commands.Cog, name='1: Voting'):
             await ctx.send("Please run .tmdb command first to store list of movies")
             return
 
-        await ctx.send("Added to Permanent Movie List: " + movies[index]['title'])
+        await ctx.send("Added to Permanent Movie List: " + club.movies[index]['title'])
 
-        new_row = pd.DataFrame([{'title': movies[index]['title'], 'imdb_id': imdb_id, 'tmdb_id': movieID}])
-        winners = pd.concat([winners, new_row], ignore_index=True)
-        winners.to_csv('clumsy-movie-winners.csv', index = False)
+        club.addWinner(club.movies[index]['title'], imdb_id, movieID)
 
 
     @commands.command(brief='List winners', description='Print the list of winners to be excluded from .rollover command')
     async def exclude_list(self, ctx):
 
-        global titles
-        await ctx.send(titles)
+        club = clubFor(ctx)
+        await ctx.send(club.titles)
 
 
     @commands.command(brief='Clear winners', description='Clear the winners list used in the .rollover command')
     async def winner_clear(self, ctx):
 
-        global titles
-        titles = []
+        club = clubFor(ctx)
+        club.clearExclusions()
+
+
+    @commands.command(brief='Search past titles', description='Fuzzy search for a title across past winners, The Fallen, the holdover list and every movie nominated at a past rollover')
+    async def search(self, ctx, *, title: str):
 
+        club = clubFor(ctx)
+
+        matches = club.title_index.search(title)
+
+        if not matches:
+            await ctx.send(f"No titles found matching: {title}")
+            return
+
+        results = f"Closest matches for {title}:\n"
+
+        for i, (score, movie, sources) in enumerate(matches):
+            results += f"[{i+1}] {movie} ({', '.join(sources)}, {score:.0%} match)\n"
+
+        await ctx.send(results)
 
-    @commands.command(brief='Display past winners', description='Display a list of past winners')
-    async def winners(self, ctx):
 
-        global winners
+    @commands.command(brief='Display past winners', description='Display a list of past winners, or use .winners <page> to display a page of their posters')
+    async def winners(self, ctx, page: int = None):
+
+        club = clubFor(ctx)
+
+        if page is not None:
+            await self.winnerPosters(ctx, club, page)
+            return
 
         results = "Clumsy Movie Past Showings:\n"
 
-        for i in range(len(winners)):
+        for i in range(len(club.winners)):
 
-            next_movie = "[" + str(i+1) + "] " + winners.iloc[i]['title'] + "\n"
+            next_movie = "[" + str(i+1) + "] " + club.winners.iloc[i]['title'] + "\n"
 
             if( len(results + next_movie) > 2000 ):
                 await ctx.send(results)
@@ -493,6 +1840,32 @@ class Voting(commands.Cog, name='1: Voting'):
         await ctx.send(results)
 
 
+    async def winnerPosters(self, ctx, club, page):
+        """ Send one page of the past winners contact sheet, rendering it only if that page's winners have changed since it was last sent """
+
+        per_page = CONTACT_SHEET_COLUMNS * CONTACT_SHEET_ROWS
+        pages = max(math.ceil(len(club.winners) / per_page), 1)
+
+        if page < 1 or page > pages:
+            await ctx.send(f"Please choose a page between 1 and {pages}")
+            return
+
+        start = (page - 1) * per_page
+        winners = club.winners.iloc[start:start + per_page]
+        winners = [(start + i + 1, title, None if pd.isna(tmdb_id) else str(tmdb_id)) for i, (title, tmdb_id) in enumerate(zip(winners['title'], winners['tmdb_id']))]
+
+        key = RenderCache.key('winners', winners)
+        embed = discord.Embed(title = f"Clumsy Movie Past Showings (page {page} of {pages})")
+
+        if key not in renders.entries:
+            await ctx.send("Fetching posters...")
+
+            poster_files = await posters.fetch([tmdb_id for number, title, tmdb_id in winners if tmdb_id is not None])
+            winners = [(number, title, poster_files.get(tmdb_id)) for number, title, tmdb_id in winners]
+
+        await renders.send(ctx, key, 'winners.jpg', embed, render_pool.render(renderContactSheet, winners))
+
+
 #     @commands.command(brief='Create a rollover list', description='Create a rollover list for the next week, with movies that have at least 1 vote. NOTE: Add winners to winner list first with winner command')
 #     async def rollover(self, ctx):
 #
@@ -523,110 +1896,109 @@ class Voting(commands.Cog, name='1: Voting'):
         # Grab rollover time just before writing rollover list
         rollover_time = datetime.utcnow().replace(tzinfo = pytz.utc)
 
-        global fallen
-
         #test_channel = client.get_channel(TEST_ID)
         #await test_channel.send("Next Week on the Wheel:")
 
         await ctx.send("Next Week on the Wheel:")
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         rollover_list = []
         fallen_list = []
 
-        async for message in channel.history(after=lastSaturday()):
+        # Snapshot of the week's nominations and their voters for the vote archive
+        nominations = []
+        voter_bits = []
+
+        async for message in channel.history(after=club.lastSaturday()):
             #await test_channel.send("Checking: " + message.content)
-            unique_users = set()
-            for reaction in message.reactions:
-                users = [user async for user in reaction.users()]
-                unique_users.update(users)
-                if(len(unique_users) > 1):
-                    break
+            if( (message.content == "Next Week on the Wheel:") or (message.content == ".rollover") ):
+                continue
 
-            if len(unique_users) > 1 and message.content not in titles:
+            bits = await messageVoters(club, message)
+            unique_voters = int(popcount(bits))
+            number_of_votes = sum(reaction.count for reaction in message.reactions)
+
+            if club.isExcluded(message.content):
+                outcome = 'winner'
+            elif unique_voters > 1:
                 rollover_list.append(message.content)
-            elif len(message.reactions) >= 0 and message.content not in titles:
-                if( (message.content != "Next Week on the Wheel:") and (message.content != ".rollover") ):
-                    fallen_list.append(message.content)
+                outcome = 'rollover'
+            else:
+                fallen_list.append(message.content)
+                outcome = 'fallen'
+
+            nominations.append((message.content, number_of_votes, unique_voters, message.created_at, outcome))
+            voter_bits.append(bits)
 
         # To the rollover
-        for movie in sorted(rollover_list):
-            #await test_channel.send(movie)
-            await ctx.send(movie)
+        await outbound.bulk(ctx, sorted(rollover_list))
 
         # To the fallen
+        club.addFallen(fallen_list)
 
-        movies = fallen['Movie']
-        movies = set(movies)
-
-        for movie in sorted(fallen_list):
-            movies.add(movie)
-
-        fallen = pd.DataFrame(sorted(movies), columns = ['Movie'])
-        fallen.to_csv('fallen.csv', index=False)
+        # To the archive
+        club.archiveWeek(rollover_time, nominations, voter_bits)
 
         # Write rollover time to an external file
-        time_pd = pd.DataFrame(data = {'Time': [rollover_time]})
-        time_pd.to_csv('rollover-time.csv', index = False)
+        club.setRolloverTime(rollover_time)
+
+        for movie in rollover_list:
+            club.nominate(movie)
 
 
     @commands.command(brief='Print the fallen list', description='Print a list of previously nominated movies that held votes from 0 or 1 voters at the time they were removed.')
     async def fallen(self, ctx):
 
-        global fallen
-
-        movies = list(fallen['Movie'])
+        club = clubFor(ctx)
 
         results = "The Fallen:\n"
+        pages = []
 
-        for i in range(len(movies)):
+        for i, movie in enumerate(club.fallen):
 
-            next_movie = "[" + str(i+1) + "] " + movies[i] + "\n"
+            next_movie = "[" + str(i+1) + "] " + movie + "\n"
 
             if( len(results + next_movie) > 2000 ):
-                await ctx.send(results)
+                pages.append(results)
                 results = ""
 
             results += next_movie
 
-        await ctx.send(results)
-
-        with open('./discord-images/fallen.jpg', 'rb') as f:
-            file = io.BytesIO(f.read())
+        await outbound.bulk(ctx, pages + [results])
 
-        image = discord.File(file, filename='fallen.jpg')
+        # Keyed on the file's modification time, so a replaced image is picked up
+        key = RenderCache.key('fallen.jpg', os.stat('./discord-images/fallen.jpg').st_mtime_ns)
         embed = discord.Embed(title = "We salute the fallen")
-        embed.set_image(url=f'attachment://fallen.jpg')
 
-        await ctx.send(file=image, embed=embed)
+        await renders.send(ctx, key, 'fallen.jpg', embed, partial(asyncio.to_thread, readFile, './discord-images/fallen.jpg'))
 
 
     @commands.command(brief='Random movie from The Fallen', description='Shuffle The Fallen list and randomly select a movie')
     async def random_fallen(self, ctx):
 
-        global fallen
+        club = clubFor(ctx)
+
+        if len(club.fallen) == 0:
+            await ctx.send("The Fallen list is empty")
+            return
 
-        movies = list(fallen['Movie'])
-        movie_index = random.randint(0, len(movies)-1)
+        movie_index = random.randrange(len(club.fallen))
 
-        await ctx.send(f"[{movie_index+1}] {movies[movie_index]}")
+        await ctx.send(f"[{movie_index+1}] {club.fallen[movie_index]}")
 
 
     @commands.command(brief = 'Remove a specified move from The Fallen', description = 'After running .fallen or .random_fallen command, use the .remove_fallen <index> command to remove the specified movie from The Fallen list.')
     async def remove_fallen(self, ctx, index):
 
         try:
-            global fallen
+            club = clubFor(ctx)
             index = int(index) - 1
 
-            movies = list(fallen['Movie'])
-            movie = movies.pop(index)
-
-            fallen = movies
+            if index < 0:
+                raise IndexError(index)
 
-            # Sort remaining movies and write back to The Fallen
-            fallen = pd.DataFrame(fallen, columns = ['Movie'])
-            fallen.to_csv('fallen.csv',index=False)
+            movie = club.removeFallen(index)
 
             await ctx.send(f"Removed from The Fallen: {movie}")
 
@@ -641,20 +2013,19 @@ class Voting(commands.Cog, name='1: Voting'):
         # Grab rollover time just before writing rollover list
         rollover_time = datetime.utcnow().replace(tzinfo = pytz.utc)
 
-        channel = client.get_channel(CHANNEL_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.channel_id)
 
         holdover_list = []
 
-        async for message in channel.history(after=lastSaturday()):
-            if len(message.reactions) > 0 and message.content not in titles:
+        async for message in channel.history(after=club.lastSaturday()):
+            if len(message.reactions) > 0 and not club.isExcluded(message.content):
                 holdover_list.append(message.content)
 
-        hold_df = pd.DataFrame(sorted(holdover_list), columns = ['Movie'])
-        hold_df.to_csv('holdover.csv', index=False)
+        club.setHoldover(holdover_list)
 
         # Write rollover time to an external file
-        time_pd = pd.DataFrame(data = {'Time': [rollover_time]})
-        time_pd.to_csv('rollover-time.csv', index = False)
+        club.setRolloverTime(rollover_time)
 
         await ctx.send("Holdover list created successfully")
         await ctx.send("Next Week on the Wheel:")
@@ -663,19 +2034,21 @@ class Voting(commands.Cog, name='1: Voting'):
     @commands.command(brief='Print a holdover list', description='Print a list of movies held over from prior weeks. Used when a list of movies is held over for a later date in lieu of special event spins (e.g. Halloween)')
     async def print_holdover(self, ctx):
 
-        global holdover
+        club = clubFor(ctx)
 
         # Grab rollover time just before writing rollover list
         rollover_time = datetime.utcnow().replace(tzinfo = pytz.utc)
 
         # Write rollover time to an external file
-        time_pd = pd.DataFrame(data = {'Time': [rollover_time]})
-        time_pd.to_csv('rollover-time.csv', index = False)
+        club.setRolloverTime(rollover_time)
 
         await ctx.send("Next Week on the Wheel:")
 
-        for movie in list(holdover['Movie']):
-            await ctx.send(movie)
+        await outbound.bulk(ctx, list(club.holdover['Movie']))
+
+        # checkNomination skips the bot's own posts, so the held over titles are nominated here as in .rollover
+        for movie in club.holdover['Movie'].dropna():
+            club.nominate(movie)
 
 
     @commands.command(brief='Generate custom BINGO card', description='Generate an image of a custom 5x5 BINGO card for movie night')
@@ -755,29 +2128,10 @@ class Voting(commands.Cog, name='1: Voting'):
 
         username = ctx.author.name
 
-        # Create the plot and set the axis labels
-        fig, ax = plt.subplots(nrows=5, ncols=5, figsize=(18,12))
-        fig.subplots_adjust(hspace=0.3)
-        fig.suptitle(f'\nBINGO Scorecard for {username}', fontsize=24)
-
-        # Add labels to each cell
-        for i in range(5):
-            for j in range(5):
-                ax[i,j].axis('on')
-                ax[i,j].xaxis.set_tick_params(labelbottom=False, colors="white")
-                ax[i,j].yaxis.set_tick_params(labelleft=False, colors="white")
-                ax[i,j].text(0.5,0.5, bingo_card[i][j], ha="center", va="center", fontsize=12, wrap=True)
-
-        plt.savefig("./discord-images/scorecard.jpg")
-
-        with open('./discord-images/scorecard.jpg', 'rb') as f:
-            file = io.BytesIO(f.read())
-
-        image = discord.File(file, filename='scorecard.jpg')
+        key = RenderCache.key('bingo', bingo_card, username)
         embed = discord.Embed(title = f'Scorecard for {username}')
-        embed.set_image(url=f'attachment://scorecard.jpg')
 
-        await ctx.send(file=image, embed=embed)
+        await renders.send(ctx, key, 'scorecard.jpg', embed, render_pool.render(renderBingo, bingo_card, username))
 
 
 ###############################################
@@ -796,8 +2150,8 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
     @commands.command(brief = 'Run TMDB search for specified title', description = 'Returns the top 10 results from TMDB for using the specified title as the search query')
     async def tmdb(self, ctx, *, title: str):
 
-        global movies
-        movies = []
+        club = clubFor(ctx)
+        club.movies = []
 
         await ctx.send("One moment please...")
 
@@ -818,7 +2172,8 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
                     'id': movie.get('id','')
  
                 }
-                movies.append(movie_dict)
+                club.movies.append(movie_dict)
+                club.rememberTmdb(movie_dict['id'], title)
                 results += "[" + str(index+1) + "] " + title + "\n"  
         except Exception as e:
             results = f"Error (Status Code: {resp.status_code}): {e}"
@@ -829,11 +2184,11 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
     @commands.command(brief = 'Show TMDB summary for selected movie', description = 'After running .tmdb command, use the .tmdb_summary <index> command to display the TMDB summary for a selected movie. If the .tmdb command has not been run previously, an error message will be produced.')
     async def tmdb_summary(self, ctx, index):
 
-        global movies
+        club = clubFor(ctx)
 
         try:
             index = int(index) - 1
-            movieID = movies[index]['id']
+            movieID = club.movies[index]['id']
 
             url = f'https://api.themoviedb.org/3/movie/{movieID}'
             headers = {
@@ -865,7 +2220,7 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
 
         if (poster_path != '') and (poster_path is not None):
             try:
-                embed_url = "https://image.tmdb.org/t/p/original" + poster_path
+                embed_url = posterUrl(poster_path)
                 embed.set_image(url=embed_url)
             except KeyError:
                 pass
@@ -876,11 +2231,14 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
     @commands.command(brief = 'Select random B-movie from TMDB Top 1000', description = '')
     async def random(self, ctx):
         global bmovies
-        bmovie_ids = bmovies['ID'].values
+        candidates = []
 
         while True:
-            index = random.randint(0,len(bmovie_ids)-1)
-            movieID = f'tt{bmovie_ids[index]}'
+            # Draw candidates in batches, since some IDs are skipped (missing from TMDB, adult, pre-1950)
+            if not candidates:
+                candidates = bmovies[rng.integers(0, len(bmovies), size=8)].tolist()
+
+            movieID = f'tt{candidates.pop():07d}'
 
             try:
 
@@ -929,7 +2287,7 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
 
         if poster_path != '':
             try:
-                embed_url = "https://image.tmdb.org/t/p/original" + poster_path
+                embed_url = posterUrl(poster_path)
                 embed.set_image(url=embed_url)
             except KeyError:
                 pass
@@ -937,6 +2295,297 @@ class TMDB_Queries(commands.Cog, name='2: TMDB Queries'):
         await ctx.send(embed=embed)
 
 
+###############################################
+#               ANALYTICS COMMANDS            #
+###############################################
+
+
+async def weekVoters(club):
+    """ Titles nominated since the last rollover that have votes, with a matrix of their voter bitsets """
+
+    channel = client.get_channel(club.channel_id)
+
+    titles = []
+    bitsets = []
+
+    async for message in channel.history(after=club.lastSaturday()):
+        if len(message.reactions) > 0 and not club.isExcluded(message.content):
+            titles.append(message.content)
+            bitsets.append(await messageVoters(club, message))
+
+    return titles, stackBits(bitsets, club.voters.width())
+
+
+class Analytics(commands.Cog, name='4: Analytics'):
+    """Summaries of this week's voters and of past weeks from the vote archive written at each rollover"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+
+    @commands.command(brief='Most nominated movies that never won', description='Lists the movies nominated in the most weeks (then most total votes) that have never been picked on the wheel. Defaults to the top 10.')
+    async def never_won(self, ctx, count: int = 10):
+
+        club = clubFor(ctx)
+
+        if len(club.vote_archive.rows) == 0:
+            await ctx.send("The vote archive is empty. It is filled in at each .rollover")
+            return
+
+        titles, weeks, votes = club.vote_archive.never_won()
+
+        results = "Most Nominated, Never Won:\n"
+
+        for i, (title, week_count, vote_count) in enumerate(zip(titles[:count], weeks[:count], votes[:count])):
+
+            next_movie = f"[{i+1}] {title} ({week_count} weeks, {vote_count} votes)\n"
+
+            if( len(results + next_movie) > 2000 ):
+                await ctx.send(results)
+                results = ""
+
+            results += next_movie
+
+        await ctx.send(results)
+
+
+    @commands.command(brief='Distinct voters this week', description='Counts the distinct people who have voted since the last rollover, and the movies with the most distinct voters')
+    async def voters(self, ctx, count: int = 5):
+
+        club = clubFor(ctx)
+        await ctx.send("Counting voters...")
+
+        titles, bits = await weekVoters(club)
+
+        if len(titles) == 0:
+            await ctx.send("No votes found since last rollover.")
+            return
+
+        per_movie = popcount(bits)
+        distinct = int(popcount(np.bitwise_or.reduce(bits, axis=0)))
+
+        results = f"Distinct voters this week: {distinct} across {len(titles)} movies ({per_movie.mean():.1f} voters per movie)\n"
+
+        for i, index in enumerate(np.argsort(-per_movie, kind='stable')[:count]):
+            results += f"[{i+1}] {titles[index]} ({per_movie[index]} voters)\n"
+
+        await ctx.send(results)
+
+
+    @commands.command(brief='Movies that share voters', description='Lists the pairs of movies nominated since the last rollover with the most voters in common')
+    async def overlap(self, ctx, count: int = 10):
+
+        club = clubFor(ctx)
+        await ctx.send("Comparing voters...")
+
+        titles, bits = await weekVoters(club)
+
+        if len(titles) < 2:
+            await ctx.send("Need at least two movies with votes since last rollover.")
+            return
+
+        # shared[i, j] is the number of voters movies i and j have in common
+        shared = popcount(bits[:, None, :] & bits[None, :, :])
+        union = popcount(bits[:, None, :] | bits[None, :, :])
+
+        first, second = np.triu_indices(len(titles), k=1)
+        pairs = shared[first, second]
+        order = np.lexsort((-union[first, second], -pairs))[:count]
+
+        results = "Movies with the most voters in common:\n"
+
+        for i, index in enumerate(order):
+            a, b = first[index], second[index]
+            next_pair = f"[{i+1}] {titles[a]} & {titles[b]}: {pairs[index]} shared voters ({pairs[index] / max(union[a, b], 1):.0%} overlap)\n"
+
+            if( len(results + next_pair) > 2000 ):
+                await ctx.send(results)
+                results = ""
+
+            results += next_pair
+
+        await ctx.send(results)
+
+
+    @commands.command(brief='Vote inflation over time', description='Shows nominations, total votes and votes per nomination for recent weeks in the vote archive (default 12 weeks), along with the weekly trend in votes per nomination.')
+    async def inflation(self, ctx, count: int = 12):
+
+        club = clubFor(ctx)
+
+        if len(club.vote_archive.rows) == 0:
+            await ctx.send("The vote archive is empty. It is filled in at each .rollover")
+            return
+
+        weeks, nominations, votes, voters, per_nomination = club.vote_archive.weeks()
+
+        # Keep the table within a single message
+        count = min(count, 40)
+
+        results = "Week        Movies  Votes  Voters  Per Movie\n"
+
+        for week, nomination_count, vote_count, voter_count, ratio in list(zip(weeks, nominations, votes, voters, per_nomination))[-count:]:
+            results += f"{str(week)[:10]}  {nomination_count:>6}  {int(vote_count):>5}  {voter_count:>6}  {ratio:>9.2f}\n"
+
+        if len(weeks) > 1:
+            # Least squares slope of votes per nomination, in votes per week
+            elapsed = (weeks - weeks[0]) / np.timedelta64(7, 'D')
+            slope = np.polyfit(elapsed.astype(float), per_nomination, 1)[0]
+            results += f"\nTrend: {slope:+.3f} votes per movie per week over {len(weeks)} weeks"
+
+        await ctx.send(f"```\n{results}\n```")
+
+
+###############################################
+#               SLASH COMMANDS                #
+###############################################
+
+
+# Seconds to wait on TMDB before giving up on a slash command
+TMDB_TIMEOUT = 10
+
+
+def choiceKey(title):
+    """ Short autocomplete value standing in for a title, since Discord cuts choice values off at 100 characters """
+
+    return 'title:' + hashlib.sha1(title.encode('utf-8')).hexdigest()[:16]
+
+
+def choices(matches):
+    """ Autocomplete choices from (title, value) pairs, within Discord's 100 character limit """
+
+    return [app_commands.Choice(name=title[:100], value=str(value)[:100]) for title, value in matches]
+
+
+class Slash(commands.Cog, name='5: Slash Commands'):
+    """Slash command versions of index based commands, with title autocomplete"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+
+    async def interaction_check(self, interaction):
+        """ Same rule as isTerminal: only the club's terminal or testing channel """
+
+        club = clubFor(interaction)
+        return club is not None and interaction.channel.id in (club.terminal_id, club.test_id)
+
+
+    @app_commands.command(name='remove_fallen', description='Remove a movie from The Fallen list')
+    @app_commands.describe(title='Movie to remove')
+    async def remove_fallen(self, interaction, title: str):
+
+        club = clubFor(interaction)
+        title = club.choiceTitle('fallen', title)
+
+        if not club.removeFallenTitle(title):
+            await interaction.response.send_message(f"Not on The Fallen: {title}")
+            return
+
+        await interaction.response.send_message(f"Removed from The Fallen: {title}")
+
+
+    @remove_fallen.autocomplete('title')
+    async def fallen_autocomplete(self, interaction, current: str):
+        club = clubFor(interaction)
+        return choices(club.complete('fallen', current)) if club else []
+
+
+    @app_commands.command(name='exclude', description='Exclude this week\'s winning movie from the rollover')
+    @app_commands.describe(title='Winning movie, as nominated this week')
+    async def exclude(self, interaction, title: str):
+
+        club = clubFor(interaction)
+        title = club.choiceTitle('nominees', title)
+        club.exclude(title)
+
+        await interaction.response.send_message("Excluded from rollover: " + title)
+
+
+    @exclude.autocomplete('title')
+    async def nominee_autocomplete(self, interaction, current: str):
+        club = clubFor(interaction)
+        return choices(club.complete('nominees', current)) if club else []
+
+
+    @app_commands.command(name='winner', description='Add a movie from a recent TMDB search to the permanent list of winners')
+    @app_commands.describe(title='Movie from a recent .tmdb search')
+    async def winner(self, interaction, title: str):
+
+        club = clubFor(interaction)
+
+        if title not in club.tmdb_titles:
+            await interaction.response.send_message("Please pick a movie from the list, or run .tmdb first to search for it")
+            return
+
+        movieID = title
+        title = club.tmdb_titles[movieID]
+
+        # The TMDB lookup can take longer than Discord's 3 second window for a response
+        await interaction.response.defer()
+
+        url = f"https://api.themoviedb.org/3/movie/{movieID}"
+        headers = {
+            "Authorization": f"Bearer {TMDB_TOKEN}"
+        }
+
+        try:
+            resp = await asyncio.to_thread(requests.get, url=url, headers=headers, timeout=TMDB_TIMEOUT)
+        except requests.RequestException as e:
+            await interaction.followup.send(f"Something went wrong looking up {title} on TMDB: {e}")
+            return
+
+        if(resp.status_code != 200):
+            await interaction.followup.send(f"Something went wrong (Status: {resp.status_code})")
+            return
+
+        imdb_id = resp.json().get('imdb_id', '')
+
+        club.addWinner(title, imdb_id, movieID)
+
+        await interaction.followup.send("Added to Permanent Movie List: " + title)
+
+
+    @winner.autocomplete('title')
+    async def tmdb_autocomplete(self, interaction, current: str):
+        club = clubFor(interaction)
+        return choices(club.complete('tmdb', current)) if club else []
+
+
+    @app_commands.command(name='search', description='Search past winners, The Fallen, holdover and past nominations')
+    @app_commands.describe(title='Title to search for')
+    async def search(self, interaction, title: str):
+
+        club = clubFor(interaction)
+
+        matches = club.title_index.search(title)
+
+        if not matches:
+            await interaction.response.send_message(f"No titles found matching: {title}")
+            return
+
+        results = f"Closest matches for {title}:\n"
+
+        for i, (score, movie, sources) in enumerate(matches):
+            results += f"[{i+1}] {movie} ({', '.join(sources)}, {score:.0%} match)\n"
+
+        await interaction.response.send_message(results)
+
+
+    @search.autocomplete('title')
+    async def search_autocomplete(self, interaction, current: str):
+
+        club = clubFor(interaction)
+
+        # interaction_check does not run for autocomplete
+        if club is None:
+            return []
+
+        if not current:
+            return choices(club.complete('winners', current))
+
+        return choices((movie, movie) for score, movie, sources in club.title_index.search(current, limit=25))
+
+
 ###############################################
 #               UTILITY COMMANDS              #
 ###############################################
@@ -952,15 +2601,62 @@ class Utility(commands.Cog, name='3: Utility'):
     @commands.command(brief='Force logout for bot', description='Forces the bot to logoff Discord. Convenience function to interrupt process from jupyter notebook')
     async def kill(self, ctx):
         await ctx.send("Thank you for using Clumsy Movie Bot. Goodbye.")
+
+        for club in clubs:
+            await club.fallen.compact()
         await self.bot.close()
         sys.exit(0)
 
 
+    @commands.command(brief='Outbound queue depth', description='Shows the Discord writes waiting in each outbound route (messages or reactions in a channel), how many have been sent and how long they waited')
+    async def outbound(self, ctx):
+
+        routes = outbound.depths()
+
+        if not routes:
+            await ctx.send("Nothing has been sent through the outbound scheduler yet")
+            return
+
+        results = "Route                          Replies  Bulk  Sent  Mean Wait  Max Wait\n"
+
+        for name, interactive, bulk, sent, mean_wait, max_wait in routes:
+            next_route = f"{name:<30} {interactive:>7} {bulk:>5} {sent:>5} {mean_wait:>9.2f}s {max_wait:>8.2f}s\n"
+
+            if( len(results + next_route) > 1990 ):
+                await ctx.send("```\n" + results + "```")
+                results = ""
+
+            results += next_route
+
+        await ctx.send("```\n" + results + "```")
+
+
+    @commands.command(brief='Recent event loop stalls', description='Shows the current event loop lag and the most recent stalls caught by the watchdog, with the command that was running and where it was blocked')
+    async def stalls(self, ctx, count: int = 5):
+
+        results = f"Event loop lag: {watchdog.lag * 1000:.0f} ms (worst {watchdog.max_lag * 1000:.0f} ms)\n"
+
+        if not watchdog.stalls:
+            results += "No stalls recorded"
+
+        for stall in list(watchdog.stalls)[-count:]:
+            next_stall = f"\n{stall['time']:%Y-%m-%d %H:%M:%S} {stall['duration']:.2f}s in {stall['command'] or 'unknown'}\n```\n{stall['stack'][-1].strip()}\n```"
+
+            if( len(results + next_stall) > 2000 ):
+                await ctx.send(results)
+                results = ""
+
+            results += next_stall
+
+        await ctx.send(results)
+
+
     # For testing/debugging purposes
 
     @commands.command(brief='Delete all messages', description='Removes last 1000 messages before current datetime (UTC) from test channel')
     async def purge(self, ctx):
-        channel = client.get_channel(TEST_ID)
+        club = clubFor(ctx)
+        channel = client.get_channel(club.test_id)
 
         # Removes the last 1000 messages in channel
         await channel.purge(limit = 1000, before = datetime.utcnow() + timedelta(1))
@@ -971,22 +2667,157 @@ class Utility(commands.Cog, name='3: Utility'):
 
         # Create sample movie nominations with emoji reactions to simulate votes
 
-        m1 = await ctx.send("Lair of the White Worm")
-        m2 = await ctx.send("Hausu")
-        m3 = await ctx.send("Hackers")
-        m4 = await ctx.send("Earth Girls are Easy")
-        m5 = await ctx.send("50 Shades Darker")
+        m1, m2, m3, m4, m5 = await outbound.bulk(ctx, ["Lair of the White Worm", "Hausu", "Hackers", "Earth Girls are Easy", "50 Shades Darker"])
+
+        await asyncio.gather(
+            outbound.react(m1, '\U0001f44d'),
+            outbound.react(m2, '\U0001f44d'),
+            outbound.react(m3, '\U0001f44d'),
+            outbound.react(m4, '\U0001f44d'),
+            outbound.react(m5, '\U0001f44d'),
+
+            outbound.react(m4, '\U0001f600'),
+            outbound.react(m5, '\U0001f600'),
+
+            outbound.react(m4, '\U0001f603')
+        )
+
+
+###############################################
+#               EVENT LOOP WATCHDOG           #
+###############################################
+
+
+class StallWatchdog:
+    """ Measures event loop lag and, when the loop is blocked, captures the stack of the code blocking it """
+
+    def __init__(self, interval=0.1, threshold=0.5, report_every=600):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_every = report_every
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.heartbeat = time.monotonic()
+        self.stalls = deque(maxlen=50)
+
+        # Stall seen by the watcher thread, finished by the ticker once the loop runs again
+        self.pending = None
+
+        self.loop_thread = None
+        self.thread = None
+
+        # Command callback code objects -> command names, for attributing stalls
+        self.commands = {}
+
+        # Most recent context (or interaction, for slash commands) for each running command, and when each command last reported
+        self.running = {}
+        self.reported = {}
+
+        # The ticker task and any reports still being sent, kept so they are not garbage collected
+        self.task = None
+        self.reports = set()
+
+    def start(self):
+
+        self.commands = {cmd.callback.__code__: cmd.qualified_name for cmd in client.walk_commands()}
+        self.commands.update({cmd.callback.__code__: '/' + cmd.qualified_name for cmd in client.tree.walk_commands()
+                              if isinstance(cmd, app_commands.Command)})
+
+        if self.thread is None:
+            self.loop_thread = threading.get_ident()
+            self.heartbeat = time.monotonic()
+            self.task = asyncio.get_running_loop().create_task(self.tick())
+            self.thread = threading.Thread(target=self.watch, name='stall-watchdog', daemon=True)
+            self.thread.start()
 
-        await m1.add_reaction('\U0001f44d')
-        await m2.add_reaction('\U0001f44d')
-        await m3.add_reaction('\U0001f44d')
-        await m4.add_reaction('\U0001f44d')
-        await m5.add_reaction('\U0001f44d')
+    async def tick(self):
+        """ Runs on the event loop: lag is how late each sleep wakes up """
 
-        await m4.add_reaction('\U0001f600')
-        await m5.add_reaction('\U0001f600')
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+            self.heartbeat = time.monotonic()
+            self.lag = self.heartbeat - start - self.interval
+            self.max_lag = max(self.max_lag, self.lag)
+
+            if self.pending is not None:
+                stall = self.pending
+                self.pending = None
+                stall['duration'] = self.lag
+                self.stalls.append(stall)
+
+                # Sent from its own task, so a slow or failing send never holds up the heartbeat
+                report = asyncio.create_task(self.report(stall))
+                self.reports.add(report)
+                report.add_done_callback(self.reports.discard)
+
+    def watch(self):
+        """ Runs on its own thread, so it keeps going while the loop is blocked """
+
+        while True:
+            time.sleep(self.interval)
+
+            if self.pending is None and time.monotonic() - self.heartbeat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self.loop_thread)
+                if frame is None:
+                    continue
+
+                self.pending = {
+                    'time': datetime.now(),
+                    'command': self.attribute(frame),
+                    'stack': traceback.format_stack(frame)[-8:]
+                }
+
+    def attribute(self, frame):
+        """ Name of the command whose callback is on the blocked stack, if any """
+
+        while frame is not None:
+            if frame.f_code in self.commands:
+                return self.commands[frame.f_code]
+            frame = frame.f_back
+
+        return None
+
+    async def report(self, stall):
+
+        print(f"Event loop blocked for {stall['duration']:.2f}s in {stall['command'] or 'unknown'}:\n{''.join(stall['stack'])}")
+
+        # Reports to Discord are limited to one per command every report_every seconds
+        ctx = self.running.get(stall['command'])
+        last = self.reported.get(stall['command'], 0)
+
+        if ctx is None or time.monotonic() - last < self.report_every:
+            return
+
+        self.reported[stall['command']] = time.monotonic()
+
+        club = clubFor(ctx)
+        channel = client.get_channel(club.terminal_id) if club else None
+
+        if channel is None:
+            return
+
+        try:
+            await outbound.send(channel, f"Watchdog: {stall['command']} blocked the bot for {stall['duration']:.2f}s at\n```\n{stall['stack'][-1].strip()}\n```")
+        except discord.DiscordException as e:
+            print(f"Watchdog could not report to #{channel}: {e}")
 
-        await m4.add_reaction('\U0001f603')
+
+watchdog = StallWatchdog(threshold=float(os.environ.get('STALL_THRESHOLD', 0.5)))
+
+
+async def trackCommand(ctx):
+    watchdog.running[ctx.command.qualified_name] = ctx
+
+
+async def untrackCommand(ctx):
+    watchdog.running.pop(ctx.command.qualified_name, None)
+
+
+async def untrackSlashCommand(interaction, command):
+    watchdog.running.pop('/' + command.qualified_name, None)
 
 
 async def setup_cogs():
@@ -996,20 +2827,129 @@ async def setup_cogs():
     await client.add_cog(TMDB_Queries(client))
     await client.remove_cog('3: Utility')
     await client.add_cog(Utility(client))
+    await client.remove_cog('4: Analytics')
+    await client.add_cog(Analytics(client))
+    await client.remove_cog('5: Slash Commands')
+    await client.add_cog(Slash(client))
+
+    # Register the slash commands with Discord once per process
+    global slash_synced
+    if not slash_synced:
+        await client.tree.sync()
+        slash_synced = True
+
+
+slash_synced = False
+
+
+# Check new nominations against past winners and this week's nominations
+
+async def checkNomination(message):
+
+    club = clubs_by_channel.get(message.channel.id)
+
+    if club is None or message.channel.id != club.channel_id:
+        return
+
+    if not message.content or message.content.startswith(client.command_prefix) or message.content == "Next Week on the Wheel:":
+        return
+
+    # Rollover lists are posted by the bot itself, and .rollover nominates those titles directly
+    if message.author.bot:
+        return
+
+    duplicate = club.nominate(message.content)
+
+    # Notices go to the terminal channel, since every message in the nominations channel is treated as a nomination.
+    # They are queued as bulk output so a burst of nominations never holds up replies to commands there.
+    terminal = client.get_channel(club.terminal_id)
+    if terminal is None:
+        return
+
+    if duplicate is not None:
+        await outbound.send(terminal, f"{message.author.display_name} nominated {message.content}, which was already nominated this week: {duplicate} ({message.jump_url})", priority=OutboundScheduler.BULK)
+        return
+
+    winner = club.title_index.match(message.content, 'winner')
+    if winner is not None:
+        await outbound.send(terminal, f"Heads up, {message.author.display_name}'s nomination {message.content} looks like a past winner: {winner} ({message.jump_url})", priority=OutboundScheduler.BULK)
+
+
+async def loadNominations(club):
+    """ Rebuild this week's nominations from channel history """
+
+    channel = client.get_channel(club.channel_id)
+    if channel is None:
+        return
+
+    nominations = {}
+    async for message in channel.history(after=club.lastSaturday()):
+        if message.content and not message.content.startswith(client.command_prefix) and message.content != "Next Week on the Wheel:":
+            nominations.setdefault(normalizeTitle(message.content), message.content)
+
+    club.nominations = nominations
+
+
+# Fold The Fallen journal back into fallen.csv in the background
+
+@tasks.loop(minutes=10)
+async def compact_fallen():
+    for club in clubs:
+        await club.fallen.compact()
 
 
 # Message bot will print to console when it is connected and ready to receive commands
 
-@client.event
 async def on_ready():
-    channel = client.get_channel(TEST_ID)
 
     await setup_cogs()
 
-    ready_msg = f"Ready to comply...\n\nLast Rollover: {lastSaturday()}"
-    await channel.send(ready_msg)
+    if not compact_fallen.is_running():
+        compact_fallen.start()
+
+    watchdog.start()
+
+    for club in clubs:
+        await loadNominations(club)
+
+        channel = client.get_channel(club.test_id)
+
+        if channel is None:
+            print(f"{club.name}: test channel {club.test_id} is not visible to the bot")
+            continue
+
+        ready_msg = f"Ready to comply...\n\nLast Rollover: {club.lastSaturday()}"
+        await outbound.send(channel, ready_msg)
+
+
+def setup():
+    """ Load the b-movie catalog and every club, and build the client. None of this runs at import, since render workers
+        import this script as __mp_main__ and must not repeat it """
+
+    global bmovies, clubs, clubs_by_channel, posters, client
+
+    bmovies = loadBmovies()
+
+    clubs = loadClubs()
+    clubs_by_channel = {channel_id: club for club in clubs for channel_id in club.channels()}
+
+    posters = PosterCache('./discord-images/posters')
 
+    # All commands for bot will be prefixed with a period (e.g. '.help')
+    # AutoShardedBot lets a single process serve many servers, with one shard per ~1000 guilds
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = ClumsyBot(command_prefix = '.', intents=intents, tree_cls=WatchedTree)
+    client.add_check(isTerminal)
 
-client.run(TOKEN)
+    client.before_invoke(trackCommand)
+    client.after_invoke(untrackCommand)
+    client.add_listener(untrackSlashCommand, 'on_app_command_completion')
+    client.add_listener(checkNomination, 'on_message')
+    client.event(on_ready)
 
 
+# Only connect when run as a script, so load-test.py can drive the bot in-process
+if __name__ == '__main__':
+    setup()
+    client.run(TOKEN)
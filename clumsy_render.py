@@ -0,0 +1,200 @@
+###############################################
+#     RENDERING (RUN IN WORKER PROCESSES)     #
+###############################################
+
+# Charts and images drawn for the bot's commands. These live outside clumsy-movie-bot.py so that
+# worker processes can import them without running the bot, and each returns the encoded image bytes.
+
+import io
+import os
+import math
+import textwrap
+
+import pandas as pd
+import numpy as np
+from matplotlib.figure import Figure
+import matplotlib.ticker as ticker
+import seaborn as sns
+from PIL import Image, ImageDraw, ImageFont
+
+
+rng = np.random.default_rng()
+
+
+def warm(memory_limit_mb=None, pids=None):
+    """ Worker initializer: report the worker's process ID, reseed, cap how far the worker's memory may grow, and load
+        fonts before the first job """
+
+    global rng
+
+    if pids is not None:
+        pids.put(os.getpid())
+
+    # Workers forked from the same fork server inherit its generator, and would otherwise all draw the same spins
+    rng = np.random.default_rng()
+
+    if memory_limit_mb:
+        try:
+            import resource
+
+            # Allowance on top of the address space the worker starts with
+            with open('/proc/self/statm') as f:
+                size = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+
+            limit = size + memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, OSError, ValueError):
+            pass
+
+    # Matplotlib builds its font cache on first use, which would otherwise land on the first render
+    fig = Figure(figsize=(1, 1))
+    fig.add_subplot().set_title('warm')
+    fig.savefig(io.BytesIO(), format='png')
+    ImageFont.load_default()
+
+
+# Wheel rule: the first movie to land this many spins wins
+WHEEL_SPINS_TO_WIN = 3
+WHEEL_SIMULATIONS = 200_000
+
+
+def wheelOdds(votes, spins_to_win=WHEEL_SPINS_TO_WIN, simulations=WHEEL_SIMULATIONS):
+    """ Monte Carlo estimate of each movie's chance of winning the wheel, given its number of entries (votes) """
+
+    votes = np.asarray(votes)
+    odds = np.zeros(len(votes))
+
+    entries = np.flatnonzero(votes > 0)
+    if len(entries) == 0:
+        return odds
+
+    # One slot per wheel entry, holding the index of the movie it belongs to
+    n = len(entries)
+    wheel = np.repeat(np.arange(n, dtype=np.int32), votes[entries].astype(int))
+
+    # Spin counts for every (simulation, movie) pair, flattened so a whole batch updates with one fancy index
+    spins = np.zeros(simulations * n, dtype=np.uint8)
+    winners = np.empty(simulations, dtype=np.int32)
+    active = np.arange(simulations, dtype=np.int32)
+    offsets = active * n
+
+    # Spin every unfinished simulation once per pass. Some movie must reach the target
+    # within n * (spins_to_win - 1) + 1 spins, so the loop is bounded.
+    while len(active) > 0:
+        picks = wheel[rng.integers(0, len(wheel), size=len(active), dtype=np.int32)]
+        cells = offsets + picks
+        counts = spins[cells] + np.uint8(1)
+        spins[cells] = counts
+
+        done = counts >= spins_to_win
+        if done.any():
+            winners[active[done]] = picks[done]
+            active = active[~done]
+            offsets = offsets[~done]
+
+    odds[entries] = np.bincount(winners, minlength=n) / simulations
+    return odds
+
+
+def renderTally(votes):
+    """ Bar chart of (title, votes) pairs annotated with each movie's odds of winning the wheel, returned as PNG bytes """
+
+    votes = pd.DataFrame.from_records(votes, columns = ['Movie', 'Number of Votes'])
+
+    votes["Number of Votes"] = pd.to_numeric(votes["Number of Votes"])
+    votes.sort_values(by = "Number of Votes", ascending = False, inplace = True)
+    votes['Movie_Trunc'] = votes['Movie'].apply(lambda x: x[:25] + '…' if len(x) > 25 else x)
+    votes['Odds'] = wheelOdds(votes['Number of Votes'].to_numpy())
+
+    # A Figure rather than pyplot's global figure, so each chart is self-contained
+    sns.set(style="whitegrid")
+    fig = Figure(figsize=(10, len(votes) * 0.5))
+    ax = fig.add_subplot()
+    sns.barplot(x='Number of Votes', y='Movie_Trunc', data=votes, color='steelblue', ax=ax)
+
+    ax.xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+    xlim = ax.get_xlim()
+    offset = (xlim[1] - xlim[0]) * 0.01  # 1% of axis width
+    ax.set_xlim(xlim[0], xlim[1] * 1.15)  # room for the odds next to the longest bar
+
+    for i, (value, odds) in enumerate(zip(votes['Number of Votes'], votes['Odds'])):
+        ax.text(value + offset, i, f'{value} ({odds:.1%})', va='center')
+
+    ax.set_xlabel(f'Votes (odds of reaching {WHEEL_SPINS_TO_WIN} spins first)')
+    ax.set_ylabel('Movie')
+    # No timestamp on the chart itself, since a cached copy is reused until the votes change (the embed title carries the time)
+    ax.set_title('Clumsy Movie Ranking')
+    fig.tight_layout()
+
+    output = io.BytesIO()
+    fig.savefig(output, format='png')
+    return output.getvalue()
+
+
+def renderBingo(bingo_card, username):
+    """ 5x5 bingo scorecard for a user, returned as JPEG bytes """
+
+    # Create the plot and set the axis labels
+    fig = Figure(figsize=(18,12))
+    ax = fig.subplots(nrows=5, ncols=5)
+    fig.subplots_adjust(hspace=0.3)
+    fig.suptitle(f'\nBINGO Scorecard for {username}', fontsize=24)
+
+    # Add labels to each cell
+    for i in range(5):
+        for j in range(5):
+            ax[i,j].axis('on')
+            ax[i,j].xaxis.set_tick_params(labelbottom=False, colors="white")
+            ax[i,j].yaxis.set_tick_params(labelleft=False, colors="white")
+            ax[i,j].text(0.5,0.5, bingo_card[i][j], ha="center", va="center", fontsize=12, wrap=True)
+
+    output = io.BytesIO()
+    fig.savefig(output, format='jpg')
+    return output.getvalue()
+
+
+# Posters per contact sheet page, and the size of each tile
+CONTACT_SHEET_COLUMNS = 5
+CONTACT_SHEET_ROWS = 4
+CONTACT_SHEET_TILE = (185, 278)
+CONTACT_SHEET_CAPTION = 36
+
+
+def renderContactSheet(entries):
+    """ Composite (number, title, poster file or None) entries into a grid of captioned posters, returned as JPEG bytes """
+
+    tile_width, tile_height = CONTACT_SHEET_TILE
+    cell_height = tile_height + CONTACT_SHEET_CAPTION
+    rows = max(math.ceil(len(entries) / CONTACT_SHEET_COLUMNS), 1)
+
+    sheet = Image.new('RGB', (CONTACT_SHEET_COLUMNS * tile_width, rows * cell_height), (24, 24, 24))
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+
+    for i, (number, title, poster_file) in enumerate(entries):
+        x = (i % CONTACT_SHEET_COLUMNS) * tile_width
+        y = (i // CONTACT_SHEET_COLUMNS) * cell_height
+
+        poster = None
+        if poster_file is not None:
+            try:
+                with Image.open(poster_file) as image:
+                    poster = image.convert('RGB').resize(CONTACT_SHEET_TILE)
+            except OSError:
+                pass
+
+        if poster is not None:
+            sheet.paste(poster, (x, y))
+        else:
+            # No poster on TMDB, so print the title in its place
+            draw.rectangle([x + 4, y + 4, x + tile_width - 5, y + tile_height - 5], outline=(90, 90, 90))
+            draw.multiline_text((x + 12, y + 12), textwrap.fill(title, 24), fill=(200, 200, 200), font=font)
+
+        caption = f"[{number}] {title}"
+        while len(caption) > 4 and draw.textlength(caption, font=font) > tile_width - 8:
+            caption = caption[:-4] + '...'
+        draw.text((x + 4, y + tile_height + 8), caption, fill=(230, 230, 230), font=font)
+
+    output = io.BytesIO()
+    sheet.save(output, format='JPEG', quality=85)
+    return output.getvalue()
@@ -0,0 +1,589 @@
+# Simulates a busy movie night against the bot in-process, with fake Discord channels in place of the gateway
+#
+# Usage:
+#   python load-test.py                                              # one minute at the default rates
+#   python load-test.py --duration 600 --users 30 --commands-per-minute 120
+#   python load-test.py --mix tally=3,tmdb=2,bingo=1 --tmdb-latency 0.3
+#
+# Nominations, reaction adds/removes and a mix of commands arrive at random (Poisson) times and are
+# dispatched through the bot's own event handlers and command processing. Nothing is sent to Discord
+# or TMDB: channels keep their messages in memory and TMDB requests are answered with canned results
+# after --tmdb-latency seconds (blocking, like the requests library the bot uses). The bot's data files
+# are copied to a temporary directory first, so the real ones are never touched. Replies still wait their turn in the
+# bot's outbound scheduler, so latency includes any queueing behind Discord's per-channel rate limit.
+#
+# Reports throughput, per-command p50/p99 latency, event loop lag and memory growth, render workers included.
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clumsy-movie-bot.py')
+
+MOVIES_CHANNEL = 1001
+TERMINAL_CHANNEL = 1002
+TEST_CHANNEL = 1003
+
+EMOJIS = ['\U0001f44d', '\U0001f600', '\U0001f603', '\U0001f525', '\U0001f480']
+
+TITLES = [
+    "Lair of the White Worm", "Hausu", "Hackers", "Earth Girls are Easy", "Miami Connection",
+    "Samurai Cop", "Troll 2", "Birdemic", "The Room", "Plan 9 from Outer Space", "Death Bed",
+    "Hard Ticket to Hawaii", "Night of the Lepus", "Manos: The Hands of Fate", "Robot Monster",
+    "The Apple", "Xanadu", "Shocking Dark", "Things", "R.O.T.O.R.", "Deadly Prey", "Zombeavers",
+    "Sharknado", "Dangerous Men", "Fateful Findings", "Miami Vice", "Velocipastor", "Frankenhooker",
+]
+
+
+###############################################
+#              FAKE DISCORD                   #
+###############################################
+
+
+class FakeUser:
+
+    def __init__(self, id, name, bot=False):
+        self.id = id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f'<@{id}>'
+
+
+class FakeGuild:
+
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeAttachment:
+
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeReaction:
+
+    def __init__(self, message, emoji):
+        self.message = message
+        self.emoji = emoji
+        self.members = []
+
+    @property
+    def count(self):
+        return len(self.members)
+
+    async def users(self, limit=None, after=None):
+        for user in list(self.members):
+            yield user
+
+
+class FakeMessage:
+
+    def __init__(self, id, channel, author, content, created_at, state):
+        self.id = id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.reactions = []
+        self.attachments = []
+        self.embeds = []
+        self._state = state
+
+    @property
+    def jump_url(self):
+        return f'https://discord.com/channels/{self.guild.id}/{self.channel.id}/{self.id}'
+
+    def reaction(self, emoji):
+
+        for reaction in self.reactions:
+            if reaction.emoji == emoji:
+                return reaction
+
+        reaction = FakeReaction(self, emoji)
+        self.reactions.append(reaction)
+        return reaction
+
+    def react(self, user, emoji):
+        """ Add a reaction, returning it if the user had not already reacted with that emoji """
+
+        reaction = self.reaction(emoji)
+        if user in reaction.members:
+            return None
+
+        reaction.members.append(user)
+        return reaction
+
+    def unreact(self, user, emoji):
+
+        reaction = self.reaction(emoji)
+        reaction.members.remove(user)
+
+        if reaction.count == 0:
+            self.reactions.remove(reaction)
+
+        return reaction
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(self.channel.simulator.api_latency)
+        self.react(self.channel.simulator.bot_user, emoji)
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeChannel:
+    """ Text channel that keeps its messages in memory, paging history the way Discord does """
+
+    def __init__(self, simulator, id, guild):
+        self.simulator = simulator
+        self.id = id
+        self.guild = guild
+        self.messages = []
+
+    def post(self, author, content):
+        return self.simulator.message(self, author, content)
+
+    async def send(self, content=None, *, embed=None, file=None, **kwargs):
+
+        await asyncio.sleep(self.simulator.api_latency)
+
+        message = self.post(self.simulator.bot_user, content or '')
+
+        if embed is not None:
+            message.embeds.append(embed)
+        if file is not None:
+            message.attachments.append(FakeAttachment(f'https://cdn.example.com/attachments/{self.id}/{message.id}/{file.filename}'))
+
+        self.simulator.sent += 1
+        return message
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+
+        if oldest_first is None:
+            oldest_first = after is not None
+
+        after = snowflake(after, 0)
+        before = snowflake(before, 1 << 63)
+        messages = [message for message in self.messages if after < message.id < before]
+
+        if not oldest_first:
+            messages.reverse()
+        if limit is not None:
+            messages = messages[:limit]
+
+        # One request per page of 100 messages
+        for i, message in enumerate(messages):
+            if i % 100 == 0:
+                await asyncio.sleep(self.simulator.api_latency)
+            yield message
+
+
+def snowflake(value, default):
+
+    import discord
+
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return discord.utils.time_snowflake(value)
+
+    return value.id
+
+
+class FakeTmdb:
+    """ Stands in for the requests module: canned TMDB and wheel responses after a blocking delay """
+
+    class Response:
+
+        def __init__(self, payload, status_code=200):
+            self.payload = payload
+            self.status_code = status_code
+
+        def json(self):
+            return self.payload
+
+    def __init__(self, latency, rng):
+        self.latency = latency
+        self.rng = rng
+        self.requests = 0
+
+    def get(self, url=None, headers=None, params=None, **kwargs):
+
+        self.requests += 1
+        time.sleep(self.latency)
+
+        if '/search/movie' in url:
+            return self.Response({'results': [{'title': title, 'release_date': f'{1960 + i}-01-01', 'id': 1000 + i}
+                                              for i, title in enumerate(self.rng.choice(TITLES, 10, replace=False))]})
+        if '/find/' in url:
+            return self.Response({'movie_results': [{'id': int(self.rng.integers(1000, 2000))}]})
+        if '/wheels/shared' in url:
+            return self.Response({'data': {'wheels': []}})
+
+        return self.Response({'title': str(self.rng.choice(TITLES)), 'overview': 'A movie.', 'release_date': '1987-01-01',
+                              'runtime': 90, 'poster_path': '/poster.jpg', 'adult': False})
+
+    def post(self, url=None, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self.Response({'data': {'path': 'load-test'}})
+
+    def delete(self, url=None, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self.Response({})
+
+
+###############################################
+#               SIMULATION                    #
+###############################################
+
+
+def load_bot(workdir):
+    """ Import clumsy-movie-bot.py from a copy of its data files, configured for a single club """
+
+    source = os.path.dirname(BOT_SCRIPT)
+
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        if name.endswith(('.csv', '.npy')):
+            shutil.copy(path, os.path.join(workdir, name))
+        elif name == 'discord-images':
+            shutil.copytree(path, os.path.join(workdir, name), ignore=shutil.ignore_patterns('posters'))
+
+    os.chdir(workdir)
+    os.environ.update({
+        'DISCORD_BOT_TOKEN': 'load-test',
+        'WHEEL_API_KEY': 'load-test',
+        'TMDB_TOKEN': 'load-test',
+        'DISCORD_MOVIES_CHANNEL': str(MOVIES_CHANNEL),
+        'DISCORD_TERMINAL_CHANNEL': str(TERMINAL_CHANNEL),
+        'DISCORD_TEST_CHANNEL': str(TEST_CHANNEL),
+        'CLUMSY_CLUBS_CONFIG': os.path.join(workdir, 'no-clubs.json'),
+    })
+
+    spec = importlib.util.spec_from_file_location('clumsy_movie_bot', BOT_SCRIPT)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    bot.setup()
+
+    return bot
+
+
+def rss_bytes(pids=()):
+    """ Resident memory of this process and of the other processes given, or this process's peak if /proc is
+        unavailable. Processes that have exited count for nothing """
+
+    total = 0
+    for pid in ('self', *pids):
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            if pid == 'self':
+                import resource
+                return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return total
+
+
+class Simulator:
+
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.api_latency = args.api_latency
+
+        self.next_id = 0
+        self.sent = 0
+        self.events = {'nomination': 0, 'reaction_add': 0, 'reaction_remove': 0, 'command': 0}
+        self.latencies = {}
+        self.errors = {}
+        self.started = {}
+        self.lag = []
+        self.memory = []
+        self.max_in_flight = 0
+
+        guild = FakeGuild(1000)
+        self.channels = {channel_id: FakeChannel(self, channel_id, guild) for channel_id in [MOVIES_CHANNEL, TERMINAL_CHANNEL, TEST_CHANNEL]}
+        self.movies = self.channels[MOVIES_CHANNEL]
+        self.terminal = self.channels[TERMINAL_CHANNEL]
+
+        self.bot_user = FakeUser(1, 'clumsy-movie-bot', bot=True)
+        self.users = [FakeUser(100 + i, f'viewer{i}') for i in range(args.users)]
+
+        self.tmdb = FakeTmdb(args.tmdb_latency, self.rng)
+
+        self.mix = []
+        for entry in args.mix.split(','):
+            name, _, weight = entry.partition('=')
+            self.mix.append((name.strip(), float(weight or 1)))
+
+    def message(self, channel, author, content):
+
+        import discord
+
+        now = datetime.now(timezone.utc)
+        self.next_id += 1
+        message = FakeMessage(discord.utils.time_snowflake(now) + self.next_id % 4096, channel, author, content, now, self.bot.client._connection)
+        channel.messages.append(message)
+
+        return message
+
+    async def install(self):
+        """ Point the bot at the fake channels and TMDB, and route its commands through FakeContext """
+
+        # Replies still queue in the bot's outbound scheduler, only the final write goes to the fake channel
+        class FakeContext(self.bot.ScheduledContext):
+            async def sendNow(self, content=None, **kwargs):
+                return await self.channel.send(content, **kwargs)
+
+        client = self.bot.client
+
+        # What login() would do: bind the client to this event loop
+        await client._async_setup_hook()
+        client._connection.user = self.bot_user
+        client.get_channel = self.channels.get
+
+        get_context = client.get_context
+        async def fake_get_context(origin, *, cls=FakeContext):
+            return await get_context(origin, cls=cls)
+        client.get_context = fake_get_context
+
+        self.bot.requests = self.tmdb
+
+        client.add_listener(self.on_command_completion, 'on_command_completion')
+        client.add_listener(self.on_command_error, 'on_command_error')
+
+    def finish(self, ctx):
+
+        started = self.started.pop(ctx.message.id, None)
+        if started is not None and ctx.command is not None:
+            self.latencies.setdefault(ctx.command.qualified_name, []).append(time.perf_counter() - started)
+
+    async def on_command_completion(self, ctx):
+        self.finish(ctx)
+
+    async def on_command_error(self, ctx, error):
+
+        name = type(getattr(error, 'original', error)).__name__
+        if name not in self.errors:
+            print(f'{ctx.command.qualified_name if ctx.command else ctx.message.content}: {error!r}')
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+        self.finish(ctx)
+
+    # Events
+
+    def nominate(self):
+
+        title = str(self.rng.choice(TITLES))
+        if self.rng.random() < 0.5:
+            title += f' ({int(self.rng.integers(1950, 2020))})'
+
+        message = self.movies.post(self.random_user(), title)
+        self.events['nomination'] += 1
+        self.bot.client.dispatch('message', message)
+
+    def react(self):
+
+        nominations = self.nominations()
+        if not nominations:
+            return
+
+        message = nominations[int(self.rng.integers(len(nominations)))]
+        user = self.random_user()
+        emoji = str(self.rng.choice(EMOJIS))
+
+        reaction = message.react(user, emoji)
+        if reaction is not None:
+            self.events['reaction_add'] += 1
+            self.bot.client.dispatch('reaction_add', reaction, user)
+
+    def unreact(self):
+
+        votes = [(message, reaction, user) for message in self.nominations() for reaction in message.reactions for user in reaction.members if not user.bot]
+        if not votes:
+            return
+
+        message, reaction, user = votes[int(self.rng.integers(len(votes)))]
+        message.unreact(user, reaction.emoji)
+        self.events['reaction_remove'] += 1
+        self.bot.client.dispatch('reaction_remove', reaction, user)
+
+    def command(self):
+
+        names = [name for name, weight in self.mix]
+        weights = np.array([weight for name, weight in self.mix])
+        name = str(self.rng.choice(names, p=weights / weights.sum()))
+
+        content = '.' + name
+        if name == 'tmdb':
+            content += ' ' + str(self.rng.choice(TITLES))
+
+        message = self.terminal.post(self.random_user(), content)
+        self.started[message.id] = time.perf_counter()
+        self.max_in_flight = max(self.max_in_flight, len(self.started))
+        self.events['command'] += 1
+        self.bot.client.dispatch('message', message)
+
+    def random_user(self):
+        return self.users[int(self.rng.integers(len(self.users)))]
+
+    def nominations(self):
+        return [message for message in self.movies.messages if not message.author.bot]
+
+    # Drivers
+
+    async def arrivals(self, rate, event, end):
+        """ Fire an event at random times averaging rate per second until the end of the evening """
+
+        if rate <= 0:
+            return
+
+        while True:
+            delay = self.rng.exponential(1 / rate)
+
+            if time.perf_counter() + delay >= end:
+                return
+
+            await asyncio.sleep(delay)
+            event()
+
+    async def sample_lag(self, end, interval=0.05):
+
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.lag.append(time.perf_counter() - start - interval)
+
+    async def progress(self, start, end):
+
+        while time.perf_counter() < end:
+            await asyncio.sleep(min(self.args.report_every, max(end - time.perf_counter(), 0.01)))
+
+            self.memory.append(rss_bytes(self.bot.render_pool.worker_pids()))
+
+            recent = np.array(self.lag[-200:]) if self.lag else np.zeros(1)
+            print(f'{time.perf_counter() - start:6.1f}s  {sum(self.events.values()):6d} events  {len(self.started):3d} commands in flight  '
+                  f'lag p99 {np.percentile(recent, 99) * 1000:7.1f} ms  rss {self.memory[-1] / 1e6:7.1f} MB')
+
+    async def run(self):
+
+        await self.install()
+
+        # The same start up the bot does in on_ready, without syncing slash commands with Discord
+        self.bot.slash_synced = True
+        await self.bot.setup_cogs()
+        self.bot.watchdog.start()
+
+        # An evening starts with last week's rollover already posted and voted on
+        for i in range(self.args.seed_nominations):
+            self.nominate()
+        for i in range(self.args.seed_nominations * 3):
+            self.react()
+
+        for club in self.bot.clubs:
+            await self.bot.loadNominations(club)
+
+        self.events = dict.fromkeys(self.events, 0)
+
+        self.memory.append(rss_bytes(self.bot.render_pool.worker_pids()))
+
+        args = self.args
+        start = time.perf_counter()
+        end = start + args.duration
+
+        await asyncio.gather(
+            self.arrivals(args.nominations_per_minute / 60, self.nominate, end),
+            self.arrivals(args.reactions_per_second, self.react, end),
+            self.arrivals(args.removals_per_second, self.unreact, end),
+            self.arrivals(args.commands_per_minute / 60, self.command, end),
+            self.sample_lag(end),
+            self.progress(start, end),
+        )
+
+        elapsed = time.perf_counter() - start
+
+        # Let the commands still running finish
+        drain_end = time.perf_counter() + args.drain
+        while self.started and time.perf_counter() < drain_end:
+            await asyncio.sleep(0.1)
+
+        self.memory.append(rss_bytes(self.bot.render_pool.worker_pids()))
+        self.report(elapsed)
+
+    def report(self, elapsed):
+
+        events = sum(self.events.values())
+        completed = sum(len(latencies) for latencies in self.latencies.values())
+
+        print()
+        print(f'Simulated {elapsed:.1f}s with {self.args.users} users: {events} events ({events / elapsed:.1f}/s), '
+              f'{completed} commands completed ({completed / elapsed * 60:.1f}/min), {self.sent} messages sent, {self.tmdb.requests} TMDB requests')
+        print('  ' + ', '.join(f'{name}: {count}' for name, count in self.events.items()))
+
+        if self.started:
+            print(f'  {len(self.started)} commands had not finished after {self.args.drain:.0f}s')
+        if self.errors:
+            print('  errors: ' + ', '.join(f'{name} x{count}' for name, count in self.errors.items()))
+
+        print()
+        print('Command          Count    p50 (ms)    p99 (ms)    max (ms)')
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = np.array(latencies) * 1000
+            print(f'{name:<14} {len(latencies):>7} {np.percentile(latencies, 50):>11.1f} {np.percentile(latencies, 99):>11.1f} {latencies.max():>11.1f}')
+
+        lag = np.array(self.lag) * 1000 if self.lag else np.zeros(1)
+        print()
+        print(f'Event loop lag: p50 {np.percentile(lag, 50):.1f} ms, p99 {np.percentile(lag, 99):.1f} ms, max {lag.max():.1f} ms, '
+              f'{len(self.bot.watchdog.stalls)} stalls over {self.bot.watchdog.threshold:.2f}s')
+        print(f'Memory (bot and render workers): {self.memory[0] / 1e6:.1f} MB at start, {self.memory[-1] / 1e6:.1f} MB at end '
+              f'({(self.memory[-1] - self.memory[0]) / 1e6:+.1f} MB), peak {max(self.memory) / 1e6:.1f} MB')
+        print(f'Most commands in flight at once: {self.max_in_flight}')
+
+
+def main(argv=None):
+
+    arg_parser = argparse.ArgumentParser(description='Simulate a movie night against the bot in-process and report how it holds up')
+    arg_parser.add_argument('--duration', type=float, default=60, help='seconds of simulated evening (default: 60)')
+    arg_parser.add_argument('--users', type=int, default=30, help='people nominating, voting and running commands (default: 30)')
+    arg_parser.add_argument('--seed-nominations', type=int, default=25, help='nominations already in the channel at the start (default: 25)')
+    arg_parser.add_argument('--nominations-per-minute', type=float, default=6, help='new nominations per minute (default: 6)')
+    arg_parser.add_argument('--reactions-per-second', type=float, default=2, help='reaction adds per second (default: 2)')
+    arg_parser.add_argument('--removals-per-second', type=float, default=0.3, help='reaction removals per second (default: 0.3)')
+    arg_parser.add_argument('--commands-per-minute', type=float, default=30, help='commands per minute (default: 30)')
+    arg_parser.add_argument('--mix', default='tally=3,tmdb=2,bingo=1', help='relative weights of the commands run (default: tally=3,tmdb=2,bingo=1)')
+    arg_parser.add_argument('--api-latency', type=float, default=0.05, help='seconds for each fake Discord request (default: 0.05)')
+    arg_parser.add_argument('--tmdb-latency', type=float, default=0.2, help='seconds each fake TMDB request blocks for (default: 0.2)')
+    arg_parser.add_argument('--drain', type=float, default=60, help='seconds to wait for running commands at the end (default: 60)')
+    arg_parser.add_argument('--report-every', type=float, default=10, help='seconds between progress lines (default: 10)')
+    arg_parser.add_argument('--seed', type=int, default=None, help='random seed, for repeatable runs')
+    args = arg_parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='clumsy-load-test-') as workdir:
+        cwd = os.getcwd()
+        try:
+            bot = load_bot(workdir)
+            asyncio.run(Simulator(bot, args).run())
+        finally:
+            os.chdir(cwd)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())